@@ -1,29 +1,55 @@
+from time import perf_counter
+_IMPORT_STARTED = perf_counter()
+
+from functools import partial
 from sys import exit
-from time import sleep
-from threading import Thread
 from yaml import safe_load, scanner, parser
-from .autounlock import AutoUnlock
-from .autopayout import AutoPayout
-from .autoprice import AutoPrice
-from .autorestart import AutoRestart
-from .autothrottle import AutoThrottle
+from .apischeduler import ApiScheduler
+from .circuitbreaker import CircuitBreaker
+from .configwatch import ConfigWatcher
+from .scheduler import Scheduler
+from . import shutdown
+from .events import bus
+from .registry import (
+    BUILTIN_MODULES,
+    LazyService,
+    discover_modules,
+    import_report,
+    resolve_requirements,
+)
 from .siad import Siad
+from .watchdog import Watchdog
 
 
 CONFIG_YAML = "config.yaml"
 
+YAML_ERRORS = (
+    scanner.ScannerError,
+    parser.ParserError,
+)
+
+# Top level keys used to build Siad, changing them needs a restart
+SIAD_KEYS = ("host", "api-password", "connection", "cache", "metrics")
+
+
+def _load_config() -> dict:
+    """Raise ValueError if config.yaml is not a mapping."""
+    with open(CONFIG_YAML) as f:
+        config = safe_load(f.read()) or {}
+    if not isinstance(config, dict):
+        raise ValueError(
+            "{} must map settings to values".format(CONFIG_YAML)
+        )
+    return config
+
 
 def _read_config() -> dict:
-    yaml_errors = (
-        scanner.ScannerError,
-        parser.ParserError,
-    )
     try:
-        return safe_load(open(CONFIG_YAML).read())
+        return _load_config()
     except FileNotFoundError:
         print("Could not find {}!".format(CONFIG_YAML))
         exit(1)
-    except yaml_errors as e:
+    except YAML_ERRORS + (ValueError,) as e:
         print("Error parsing {}:".format(CONFIG_YAML))
         print(e)
         exit(1)
@@ -40,78 +66,282 @@ def _get_siad(config: dict) -> Siad:
     if not api_password:
         print("Warning: no API password set")
 
-    return Siad(host, api_password)
+    connection = config.get("connection") or {}
+    cache = config.get("cache") or {}
+    metrics = config.get("metrics") or {}
+    try:
+        cache_ttl = {
+            "/{}".format(endpoint): float(ttl)
+            for endpoint, ttl in cache.items()
+        }
+        return Siad(
+            host,
+            api_password,
+            pool_size=int(connection.get("pool-size", 10)),
+            connect_timeout=float(connection.get("connect-timeout", 3.05)),
+            read_timeout=float(connection.get("read-timeout", 30)),
+            unlock_timeout=float(connection.get("unlock-timeout", 0)) or None,
+            keep_alive=bool(connection.get("keep-alive", True)),
+            cache_ttl=cache_ttl,
+            metrics_interval=float(metrics.get("interval", 0)),
+            retries=int(connection.get("retries", 2)),
+            retry_backoff=float(connection.get("retry-backoff", 0.5)),
+            breaker=CircuitBreaker(
+                failure_threshold=int(connection.get("breaker-threshold", 5)),
+                reset_timeout=float(connection.get("breaker-reset", 30)),
+            ),
+            api_scheduler=ApiScheduler(
+                concurrency=int(connection.get("concurrency", 4)),
+                rate=float(connection.get("rate", 20)),
+                burst=float(connection.get("burst", 20)),
+            ),
+        )
+    except (ValueError, TypeError, AttributeError) as e:
+        print(
+            "Invalid config section 'connection', 'cache' or 'metrics': {}"
+            .format(e)
+        )
+        exit(1)
 
 
-def get_module(config_section, auto_module, *args):
-    """Get None, the module or exit(1)"""
+def _get_async_siad(config: dict):
+    """AsyncSiad with the connection settings of Siad, needs aiohttp."""
+    from .asyncsiad import AsyncSiad
+    connection = config.get("connection") or {}
+    return AsyncSiad(
+        config.get("host"),
+        config.get("api-password", ""),
+        pool_size=int(connection.get("pool-size", 10)),
+        connect_timeout=float(connection.get("connect-timeout", 3.05)),
+        read_timeout=float(connection.get("read-timeout", 30)),
+        keep_alive=bool(connection.get("keep-alive", True)),
+    )
+
+
+def _start_async_runner(async_siad: LazyService):
+    """The event loop of AsyncAutoModules, started on first use."""
+    from .asyncmodule import AsyncRunner
+    runner = AsyncRunner()
+
+    async def close_async_siad():
+        if async_siad.built:
+            await async_siad.get().close()
+
+    runner.on_stop(close_async_siad)
+    runner.start()
+    return runner
+
+
+def __getattr__(name):
+    """Keep `from lazysiahosting import AutoPrice` working, lazily."""
+    for spec in BUILTIN_MODULES:
+        if spec.class_name == name:
+            return spec.load()
+    raise AttributeError(name)
+
+
+def build_module(config_section, auto_module, services: dict):
+    """Get None or the module, raise ValueError if misconfigured.
+
+    auto_module is a class or a ModuleSpec, which is only
+    imported if the section is enabled.
+    """
     config_section = config_section or {}
+    if not isinstance(config_section, dict):
+        raise ValueError(
+            "A module section must map settings to values, not {!r}"
+            .format(config_section)
+        )
     enabled = config_section.get("enabled", False)
     if not enabled:
         return
+    if hasattr(auto_module, "load"):
+        auto_module = auto_module.load()
+    args = resolve_requirements(auto_module, services)
+    module = auto_module(config_section, *args)
+    module.configure_runtime(config_section)
+    return module
+
+
+def get_module(config_section, auto_module, services: dict):
+    """Get None, the module or exit(1)"""
     try:
-        return auto_module(config_section, *args)
-    except ValueError as e:
+        return build_module(config_section, auto_module, services)
+    except (ValueError, ImportError) as e:
         print(e)
         exit(1)
 
 
-def _get_enabled_modules(config: dict, siad: Siad) -> list:
-    modules_enabled = []
+def _get_enabled_modules(config: dict, specs: tuple, services: dict) -> dict:
+    """Config section => enabled module"""
+    modules_enabled = {}
+
+    for spec in specs:
+        module = get_module(config.get(spec.section), spec, services)
+        if module:
+            modules_enabled[spec.section] = module
 
-    # AutoUnlock
-    auto_unlock = get_module(config.get("unlock"), AutoUnlock, siad)
-    if auto_unlock:
-        modules_enabled.append(auto_unlock)
+    for module in modules_enabled.values():
+        module.print_settings()
 
-    # AutoPrice
-    auto_price = get_module(config.get("price"), AutoPrice, siad)
-    if auto_price:
-        modules_enabled.append(auto_price)
+    return modules_enabled
 
-    # AutoRestart
-    auto_restart = get_module(config.get("restart"), AutoRestart, siad)
-    if auto_restart:
-        modules_enabled.append(auto_restart)
 
-    # AutoThrottle
-    auto_throttle = get_module(config.get("throttle"), AutoThrottle)
-    if auto_throttle:
-        modules_enabled.append(auto_throttle)
+class ConfigReloader:
+    """Apply changes of config.yaml to the running modules.
 
-    # AutoPayout
-    auto_payout = get_module(config.get("payout"), AutoPayout, siad)
-    if auto_payout:
-        modules_enabled.append(auto_payout)
+    Only modules whose section changed are rebuilt. If any changed
+    section is invalid, nothing is applied. A rebuilt module starts
+    once the tick in flight of the old one returned.
+    """
 
-    for module in modules_enabled:
-        module.print_settings()
+    def __init__(
+        self,
+        config: dict,
+        specs: tuple,
+        services: dict,
+        modules: dict,
+        async_runner: LazyService,
+    ):
+        self.config = config
+        self.specs = specs
+        self.services = services
+        self.scheduler = services["scheduler"]
+        self.modules = modules
+        self.async_runner = async_runner
 
-    return modules_enabled
+    def start(self, module):
+        if module.is_async:
+            self.async_runner.get().add(module)
+        else:
+            self.scheduler.add(module)
+
+    def stop(self, module, then=None):
+        """Stop module, call then() once its tick in flight returned."""
+        module.unsubscribe_all()
+
+        def stopped():
+            module.print("Module stopped")
+            if then:
+                then()
+
+        if module.is_async:
+            self.async_runner.get().remove(module, stopped)
+        else:
+            self.scheduler.remove(module, stopped)
+
+    def reload(self):
+        try:
+            config = _load_config()
+        except (OSError, ValueError) + YAML_ERRORS as e:
+            print("Config reload failed, keeping the running configuration:")
+            print(e)
+            return
+
+        for key in SIAD_KEYS:
+            if config.get(key) != self.config.get(key):
+                print("Changing '{}' requires a restart, ignored".format(key))
+            config[key] = self.config.get(key)
+
+        changed = [
+            spec for spec in self.specs
+            if config.get(spec.section) != self.config.get(spec.section)
+        ]
+        if not changed:
+            return
+
+        # Validate every changed section before stopping anything
+        new_modules = {}
+        for spec in changed:
+            try:
+                new_modules[spec.section] = build_module(
+                    config.get(spec.section), spec, self.services
+                )
+            except (
+                ValueError, TypeError, AttributeError, SystemExit, ImportError
+            ) as e:
+                print(
+                    "Invalid config section '{}', keeping the running "
+                    "configuration: {}".format(spec.section, e)
+                )
+                for module in new_modules.values():
+                    if module:
+                        module.unsubscribe_all()
+                return
+
+        for section, module in new_modules.items():
+            old_module = self.modules.pop(section, None)
+            start = None
+            if module:
+                module.print_settings()
+                self.modules[section] = module
+                start = partial(self.start, module)
+            if old_module:
+                self.stop(old_module, then=start)
+            elif start:
+                start()
+
+        self.config = config
+        print("Config reloaded: {}".format(", ".join(new_modules)))
 
 
 def main():
     config = _read_config()  # Might exit
     siad = _get_siad(config)  # Might exit
 
-    modules_enabled = _get_enabled_modules(config, siad)  # Might exit
+    scheduler_config = config.get("scheduler") or {}
+    scheduler = Scheduler(
+        workers=int(scheduler_config.get("workers", 4)),
+        grace=float(scheduler_config.get("grace", 0.5)),
+    )
+    # Shared by all modules, i.e. plugins of other packages
+    services = {
+        "siad": siad,
+        # For AsyncAutoModules, built once the first one needs it
+        "async_siad": LazyService(lambda: _get_async_siad(config)),
+        "scheduler": scheduler,
+        "events": bus,
+    }
+
+    specs = discover_modules()
+    modules_enabled = _get_enabled_modules(config, specs, services)  # Might exit
 
     print(
         "# ====\n"
-        "# Modules initialized. Starting...\n"
+        "# Modules initialized in {:.0f}ms. Starting...\n"
         "# ===="
+        .format((perf_counter() - _IMPORT_STARTED) * 1000)
     )
+    for line in import_report(specs):
+        print("# Import {}".format(line))
 
-    for module in modules_enabled:
-        t = Thread(target=module.run)
-        t.start()
+    shutdown.install_signal_handlers()
+    shutdown.on_shutdown(scheduler.stop)
 
+    async_runner = LazyService(
+        partial(_start_async_runner, services["async_siad"])
+    )
+    for module in modules_enabled.values():
+        if module.is_async:
+            async_runner.get().add(module)
+        else:
+            scheduler.add(module)
 
-    while True:
-        try:
-            sleep(3600)
-        except KeyboardInterrupt:
-            return
+    watchdog_config = config.get("watchdog") or {}
+    if watchdog_config.get("enabled", True):
+        Watchdog(
+            scheduler,
+            factor=float(watchdog_config.get("factor", 2)),
+        ).start()
+
+    if config.get("watch-config", True):
+        reloader = ConfigReloader(
+            config, specs, services, modules_enabled, async_runner
+        )
+        ConfigWatcher(CONFIG_YAML, reloader.reload).start()
+
+    scheduler.run()
+    print("Stopped")
 
 
 
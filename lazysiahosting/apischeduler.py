@@ -0,0 +1,127 @@
+"""Priority-aware admission of siad API calls.
+
+When siad is busy, a health check or an unlock matters more than
+a hostdb download. Calls wait for a concurrency slot and a token of
+a token bucket, in order of priority. Critical calls skip the
+bucket, and bulk calls never take the last free slot.
+"""
+from contextlib import contextmanager
+from itertools import count
+from threading import Condition, local
+from time import monotonic
+
+CRITICAL = 0
+NORMAL = 1
+BULK = 2
+
+PRIORITY_NAMES = {
+    CRITICAL: "critical",
+    NORMAL: "normal",
+    BULK: "bulk",
+}
+
+
+class ApiScheduler:
+    def __init__(self, concurrency: int = 4, rate: float = 20, burst: float = 20):
+        self.concurrency = concurrency
+        # Keep one slot for more important calls
+        self.bulk_concurrency = max(1, concurrency - 1)
+        self.rate = rate
+        self.burst = burst
+
+        self._condition = Condition()
+        self._sequence = count()
+        self._waiting = []
+        self._in_flight = 0
+        self._bulk_in_flight = 0
+        self._tokens = burst
+        self._refilled = monotonic()
+        self._local = local()
+
+        # priority => [calls, calls that had to wait, seconds waited]
+        self._stats = {priority: [0, 0, 0.0] for priority in PRIORITY_NAMES}
+
+    @property
+    def stats(self) -> dict:
+        with self._condition:
+            return {
+                PRIORITY_NAMES[priority]: {
+                    'calls': calls,
+                    'waited': waited,
+                    'wait_seconds': seconds,
+                }
+                for priority, (calls, waited, seconds) in self._stats.items()
+            }
+
+    def _refill(self, now: float):
+        self._tokens = min(
+            self.burst, self._tokens + (now - self._refilled) * self.rate
+        )
+        self._refilled = now
+
+    def _has_slot(self, priority: int) -> bool:
+        if self._in_flight >= self.concurrency:
+            return False
+        if priority == BULK and self._bulk_in_flight >= self.bulk_concurrency:
+            return False
+        return True
+
+    def _next_admissible(self):
+        """Most important waiting ticket that would get a slot."""
+        for ticket in sorted(self._waiting):
+            if self._has_slot(ticket[0]):
+                return ticket
+        return None
+
+    def _acquire(self, priority: int):
+        start = monotonic()
+        with self._condition:
+            ticket = (priority, next(self._sequence))
+            self._waiting.append(ticket)
+            while True:
+                timeout = None
+                if self._next_admissible() == ticket:
+                    if priority == CRITICAL:
+                        break
+                    now = monotonic()
+                    self._refill(now)
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        break
+                    timeout = (1 - self._tokens) / self.rate
+                self._condition.wait(timeout)
+
+            self._waiting.remove(ticket)
+            self._in_flight += 1
+            if priority == BULK:
+                self._bulk_in_flight += 1
+
+            waited = monotonic() - start
+            stats = self._stats[priority]
+            stats[0] += 1
+            if waited > 0.001:
+                stats[1] += 1
+                stats[2] += waited
+            # The next waiter might be admissible now
+            self._condition.notify_all()
+
+    def _release(self, priority: int):
+        with self._condition:
+            self._in_flight -= 1
+            if priority == BULK:
+                self._bulk_in_flight -= 1
+            self._condition.notify_all()
+
+    @contextmanager
+    def slot(self, priority: int = NORMAL):
+        """Hold a slot while talking to siad, reentrant per thread."""
+        if getattr(self._local, 'held', False):
+            yield
+            return
+        self._acquire(priority)
+        self._local.held = True
+        try:
+            yield
+        finally:
+            self._local.held = False
+            self._release(priority)
@@ -0,0 +1,101 @@
+"""Template for modules running in the shared event loop"""
+import asyncio
+from threading import Thread
+from .automodule import AutoModule
+from . import shutdown
+
+
+class AsyncAutoModule(AutoModule):
+    """Inherit to implement a module running in the shared event loop.
+
+    _run is a coroutine and must only wait with await,
+    never block the loop with sleep() or blocking IO.
+    """
+    is_async = True
+
+    async def tick(self):
+        raise NotImplementedError()
+
+    async def _run(self):
+        while True:
+            delay = await self.tick()
+            self.record_success()
+            await asyncio.sleep(self.next_interval() if delay is None else delay)
+
+    async def run(self):
+        """Do the magic, restart in case of a thrown exception."""
+        while True:
+            self.print("Start module")
+            try:
+                await self._run()
+            except Exception:
+                delay = self.record_failure()
+                if delay is None:
+                    return
+                await asyncio.sleep(delay)
+
+
+class AsyncRunner:
+    """The shared event loop on its own thread, until shutdown.
+
+    Modules can be added and removed from other threads,
+    i.e. by the config reload.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._tasks = {}
+        self._closers = []
+        self.thread = Thread(target=self._run, name="event-loop", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        shutdown.on_shutdown(self.stop)
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.loop.run_forever()
+        finally:
+            self.loop.close()
+
+    def on_stop(self, close):
+        """Await close() once the modules stopped, i.e. AsyncSiad.close."""
+        self._closers.append(close)
+
+    def add(self, module: AsyncAutoModule):
+        def create():
+            self._tasks[module] = self.loop.create_task(module.run())
+        self.loop.call_soon_threadsafe(create)
+
+    def remove(self, module: AsyncAutoModule, then=None):
+        """Cancel module, call then() once its run() returned."""
+        def cancel():
+            task = self._tasks.pop(module, None)
+            if task is None or task.done():
+                if then:
+                    then()
+                return
+            # Cancelling interrupts every await, including sleeps
+            task.cancel()
+            if then:
+                task.add_done_callback(lambda task: then())
+        self.loop.call_soon_threadsafe(cancel)
+
+    def stop(self):
+        async def cancel_all():
+            tasks = list(self._tasks.values())
+            self._tasks.clear()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            for close in self._closers:
+                try:
+                    await close()
+                except Exception as e:
+                    print("Error closing the event loop: {}".format(e))
+            self.loop.stop()
+
+        self.loop.call_soon_threadsafe(
+            lambda: self.loop.create_task(cancel_all())
+        )
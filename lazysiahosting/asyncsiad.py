@@ -0,0 +1,135 @@
+"""asyncio counterpart of Siad, requires aiohttp."""
+from time import time
+from aiohttp import BasicAuth, ClientSession, ClientTimeout, TCPConnector
+from .hostdb import ArrayItemParser, HostDBIndex, format_pubkey, reduce_fields
+from .siad import (
+    HOSTDB_CHUNK_SIZE,
+    Result,
+    siacoin_to_hastings,
+    tiny_price_to_big_price,
+)
+
+
+class AsyncSiad:
+    """Communicate with the service siad from an event loop.
+
+    All coroutines of all modules share one connection pool.
+    The session is created on first use, inside the running loop.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        api_password: str,
+        pool_size: int = 10,
+        connect_timeout: float = 3.05,
+        read_timeout: float = 30,
+        keep_alive: bool = True,
+    ):
+        self.host = host
+        self.api_password = api_password
+        self.pool_size = pool_size
+        self.timeout = ClientTimeout(
+            sock_connect=connect_timeout,
+            sock_read=read_timeout,
+        )
+        self.keep_alive = keep_alive
+        self._session = None
+        self.hostdb = HostDBIndex()
+
+    @property
+    def session(self) -> ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = ClientSession(
+                connector=TCPConnector(
+                    limit=self.pool_size,
+                    force_close=not self.keep_alive,
+                ),
+                auth=BasicAuth('', self.api_password),
+                headers={'User-Agent': 'Sia-Agent'},
+                timeout=self.timeout,
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+
+    async def request(self, method: str, uri, **kwargs) -> (int, str):
+        url = 'http://' + self.host + uri
+        async with self.session.request(method, url, **kwargs) as res:
+            return res.status, await res.text()
+
+    async def request_json(self, method: str, uri, **kwargs):
+        url = 'http://' + self.host + uri
+        async with self.session.request(method, url, **kwargs) as res:
+            # An error document is no result, see Siad.get_snapshot
+            res.raise_for_status()
+            return await res.json(content_type=None)
+
+    async def set_host(self, key, value):
+        return await self.request(
+            'POST', '/host?{}={}'.format(key, value)
+        )
+
+    async def get_host(self) -> dict:
+        return await self.request_json('GET', '/host')
+
+    async def get_wallet(self) -> dict:
+        return await self.request_json('GET', '/wallet')
+
+    async def get_consensus(self) -> dict:
+        return await self.request_json('GET', '/consensus')
+
+    async def unlock_wallet(self, walletpassword: str) -> Result:
+        _, text = await self.request(
+            'POST', '/wallet/unlock',
+            params={'encryptionpassword': walletpassword},
+        )
+        if not text:
+            return Result.SUCCESS
+        if "wallet has already been unlocked" in text:
+            return Result.SUCCESS
+        return Result.FAILURE
+
+    async def iter_hostdb(self, fields: tuple = None):
+        """Stream the active hosts, keeping only fields of each."""
+        url = 'http://' + self.host + '/hostdb/active'
+        parser = ArrayItemParser()
+        async with self.session.request('GET', url) as res:
+            res.raise_for_status()
+            async for chunk in res.content.iter_chunked(HOSTDB_CHUNK_SIZE):
+                for host in parser.feed(chunk):
+                    yield reduce_fields(host, fields)
+                if parser.done:
+                    return
+        parser.close()
+
+    async def refresh_hostdb(self) -> HostDBIndex:
+        """Download the hostdb into self.hostdb."""
+        timestamp = time()
+        hosts = [host async for host in self.iter_hostdb(HostDBIndex.FIELDS)]
+        self.hostdb.refresh(hosts, timestamp)
+        return self.hostdb
+
+    async def get_hostdb_rank_and_price(self, refresh: bool = True):
+        if refresh:
+            await self.refresh_hostdb()
+
+        host = await self.get_host()
+        entry = self.hostdb.lookup(
+            netaddress=host['externalsettings']['netaddress'],
+            pubkey=format_pubkey(host['publickey']),
+        )
+        if entry is None:
+            return None
+        return (entry.rank, tiny_price_to_big_price(entry.storageprice))
+
+    async def send_siacoins(self, amount_in_siacoins_not_hastings: float, address: str):
+        return await self.request_json(
+            'POST', "/wallet/siacoins",
+            data={
+                "amount": siacoin_to_hastings(amount_in_siacoins_not_hastings),
+                "destination": address,
+            }
+        )
@@ -1,12 +1,60 @@
 """Template for modules"""
 import traceback
-from time import sleep
+from collections import deque
+from subprocess import TimeoutExpired, call
+from time import monotonic
+from .circuitbreaker import backoff_delay
+from .events import MODULE_FAILED, MODULE_STUCK, SIAD_DOWN, SIAD_UP, bus
 
+# Restart a failing module after jittered, exponentially growing delays
+RESTART_BACKOFF = 2
 EXCEPTION_RESTART_COOLDOWN = 120
+# Escalate after more failures than FAILURE_BUDGET within FAILURE_WINDOW
+FAILURE_BUDGET = 10
+FAILURE_WINDOW = 600
+ESCALATION_COOLDOWN = 3600
 
 
 class AutoModule:
-    """Inherit to implement a module."""
+    """Inherit to implement a module.
+
+    A module does one round of work per tick(). The scheduler calls
+    it every `interval` seconds, a tick may return a number of seconds
+    to wait until the next tick instead.
+
+    If min_interval and max_interval are set, the interval adapts:
+    it drops to min_interval after a tick called state_changed() and
+    grows by backoff_factor per quiet tick up to max_interval.
+    """
+    # Seconds between two ticks
+    interval = 60
+    # True for modules run in the event loop instead of the scheduler
+    is_async = False
+    # Name of the section in config.yaml
+    config_section = None
+    # Shared services passed to __init__ after the config, in order:
+    # "siad" (the pooled Siad), "async_siad" (the pooled AsyncSiad,
+    # for AsyncAutoModules), "scheduler" and "events" (the bus)
+    requires = ()
+    min_interval = None
+    max_interval = None
+    backoff_factor = 2
+    # Seconds a tick may be late and take, defaults to interval
+    deadline = None
+
+    failure_budget = FAILURE_BUDGET
+    failure_window = FAILURE_WINDOW
+
+    _changed = False
+    _current_interval = None
+    _consecutive_failures = 0
+    _failures = None
+    # Set by the scheduler running the module
+    _wake = None
+    _heartbeat = None
+    # Maintained after follow_siad_state()
+    siad_down = False
+
     def __init__(self, configuration_dictionary: dict):
         """Validate configuration, raise ValueError if invalid."""
         raise NotImplementedError()
@@ -21,28 +69,155 @@ class AutoModule:
     def print_settings(self):
         raise NotImplementedError()
 
-    def _run(self):
-        raise NotImplementedError()
+    def configure_runtime(self, configuration_dictionary: dict):
+        """Read optional interval and failure budget keys."""
+        min_interval = configuration_dictionary.get("min-interval")
+        max_interval = configuration_dictionary.get("max-interval")
+        failure_budget = configuration_dictionary.get("failure-budget")
+        failure_window = configuration_dictionary.get("failure-window")
+        if min_interval:
+            self.min_interval = float(min_interval)
+        if max_interval:
+            self.max_interval = float(max_interval)
+        if failure_budget:
+            self.failure_budget = int(failure_budget)
+        if failure_window:
+            self.failure_window = float(failure_window)
+        if (self.min_interval or 0) > (self.max_interval or float('inf')):
+            raise ValueError(
+                "{}: 'min-interval' is greater than 'max-interval'."
+                .format(self.name)
+            )
+
+    def publish(self, event: str, **data):
+        bus.publish(event, module=self.name, **data)
+
+    def subscribe(self, event: str, callback):
+        """Call callback(event) whenever event is published."""
+        if '_subscriptions' not in self.__dict__:
+            self._subscriptions = []
+        self._subscriptions.append((event, callback))
+        bus.subscribe(event, callback)
+
+    def unsubscribe_all(self):
+        for event, callback in self.__dict__.get('_subscriptions', []):
+            bus.unsubscribe(event, callback)
+        self._subscriptions = []
+
+    def follow_siad_state(self):
+        """Track siad_down from events, tick right when siad is back."""
+        def on_down(event):
+            self.siad_down = True
+
+        def on_up(event):
+            self.siad_down = False
+            self.wake()
+
+        self.subscribe(SIAD_DOWN, on_down)
+        self.subscribe(SIAD_UP, on_up)
+
+    def run_command(self, command: str, timeout: float = None):
+        """Run a shell command, return its exit code or None on timeout."""
+        self.heartbeat()
+        try:
+            return call(command, shell=True, timeout=timeout)
+        except TimeoutExpired:
+            self.print("Timeout after {}s: $ {}".format(timeout, command))
+            return None
+        finally:
+            self.heartbeat()
 
-    def run(self):
-        """Do the magic, restart in case of a thrown exception."""
-        while True:
-            self.print("Start module")
-            try:
-                self._run()
-            except Exception:
-                print(
-                    "# ========\n"
-                    "# Uncaught exception in module: {}\n"
-                    "# ========"
-                    .format(self.name)
-                )
-                traceback.print_exc()
-                print(
-                    "# ========\n"
-                    "# Restarting module in two minutes.\n"
-                    "# ========"
-                )
-                sleep(EXCEPTION_RESTART_COOLDOWN)
+    def heartbeat(self):
+        """Tell the watchdog a long tick is still making progress."""
+        if self._heartbeat is not None:
+            self._heartbeat()
 
+    def on_stuck(self, seconds: float) -> bool:
+        """The watchdog gave up on a tick silent for seconds.
 
+        Return True to restart the module, False to disable it.
+        """
+        self.publish(MODULE_STUCK, seconds=seconds)
+        return True
+
+    def wake(self):
+        """Tick as soon as possible, i.e. from an event callback."""
+        self.state_changed()
+        if self._wake is not None:
+            self._wake()
+
+    def state_changed(self):
+        """Call from tick() when something changed to poll quickly again."""
+        self._changed = True
+
+    def next_interval(self) -> float:
+        """Seconds until the next tick, consumes state_changed()."""
+        low = self.min_interval or self.interval
+        high = self.max_interval or self.interval
+        if self._current_interval is None or self._changed:
+            interval = low
+        else:
+            interval = self._current_interval * self.backoff_factor
+        self._current_interval = max(low, min(high, interval))
+        self._changed = False
+        return self._current_interval
+
+    def record_success(self):
+        self._consecutive_failures = 0
+
+    def record_failure(self) -> float:
+        """Report the current exception.
+
+        Returns the seconds to wait before restarting the module,
+        or None if it has to be disabled.
+        """
+        now = monotonic()
+        if self._failures is None:
+            self._failures = deque()
+        self._failures.append(now)
+        while self._failures[0] < now - self.failure_window:
+            self._failures.popleft()
+
+        print(
+            "# ========\n"
+            "# Uncaught exception in module: {}\n"
+            "# ========"
+            .format(self.name)
+        )
+        traceback.print_exc()
+
+        if len(self._failures) > self.failure_budget:
+            self.print(
+                "{} failures within {}s, failure budget exceeded"
+                .format(len(self._failures), self.failure_window)
+            )
+            delay = self.escalate(len(self._failures))
+            self._failures.clear()
+            self._consecutive_failures = 0
+        else:
+            delay = backoff_delay(
+                self._consecutive_failures,
+                RESTART_BACKOFF,
+                EXCEPTION_RESTART_COOLDOWN,
+            )
+            self._consecutive_failures += 1
+
+        if delay is None:
+            message = "# Module disabled."
+        else:
+            message = "# Restarting module in {:.1f}s.".format(delay)
+        print("# ========\n" + message + "\n# ========")
+        return delay
+
+    def escalate(self, failures: int) -> float:
+        """Failure budget exceeded, something is really broken.
+
+        Returns the seconds to park the module, None disables it.
+        Override to escalate differently.
+        """
+        self.publish(MODULE_FAILED, failures=failures)
+        return ESCALATION_COOLDOWN
+
+    def tick(self):
+        """Do one round of work, optionally return the next delay."""
+        raise NotImplementedError()
@@ -1,5 +1,7 @@
-from time import sleep, time
 from .automodule import AutoModule
+from .events import WALLET_UNLOCKED
+from . import shutdown
+from .apischeduler import BULK
 from .siad import Siad
 
 
@@ -52,6 +54,9 @@ def blocksize_from_block(block) -> float:
 
 
 class AutoPayout(AutoModule):
+    config_section = "payout"
+    requires = ("siad",)
+
     def __init__(self, configuration_dictionary: dict, siad: Siad):
         self.siad = siad
         minimum_available = configuration_dictionary.get("minimum-available")
@@ -68,8 +73,16 @@ class AutoPayout(AutoModule):
     
         self.minimum_available = float(minimum_available)
         self.sleep_after = float(sleep_after)
+        self.interval = self.sleep_after
+        self.min_interval = self.sleep_after
+        # Back off beyond sleep-after only if max-interval asks for it
+        self.max_interval = self.sleep_after
         self.block = block_to_transaction_jobs(block)
 
+        # Sending needs an unlocked wallet
+        self.subscribe(WALLET_UNLOCKED, lambda event: self.wake())
+        self.follow_siad_state()
+
     @property
     def name(self) -> str:
         return "AutoPayout"
@@ -84,7 +97,8 @@ class AutoPayout(AutoModule):
 
     def perform_payout(self):
         blocksize = blocksize_from_block(self.block)
-        balance = self.siad.balance
+        with self.siad.priority(BULK):
+            balance = self.siad.balance
         payout_threshold = self.minimum_available + blocksize
 
         if payout_threshold > balance:
@@ -93,6 +107,10 @@ class AutoPayout(AutoModule):
 
         self.print("Performing payout")
         for entry in self.block:
+            if shutdown.is_set():
+                # Never stop in the middle of a send, only between them
+                self.print("Payout aborted by shutdown before {}".format(entry))
+                return
             result = self.siad.send_siacoins(
                 amount_in_siacoins_not_hastings=entry.amount,
                 address=entry.address,
@@ -100,8 +118,9 @@ class AutoPayout(AutoModule):
             self.print("Payout result {} {}".format(entry, result))
 
         self.print("Payout done")
+        self.state_changed()
 
-    def _run(self):
-        while True:
-            self.perform_payout()
-            sleep(self.sleep_after)
\ No newline at end of file
+    def tick(self):
+        if self.siad_down:
+            return
+        self.perform_payout()
@@ -1,15 +1,54 @@
-from time import sleep
+from threading import Thread
+from time import monotonic
+from requests.exceptions import RequestException
 from .automodule import AutoModule
+from .events import PRICE_CHANGED
+from .exchangerate import get_cached_rate
+from .pricecontrol import ConvergenceTracker, RankModel, get_controller
 from .siastats import Siastats
 from .siad import Siad
 
 
+# A rank source failing this way is skipped for the cycle
+SOURCE_ERRORS = (RequestException, LookupError, ValueError)
+
+
+def call_concurrently(calls: dict) -> dict:
+    """Run every call on its own thread, name => (result, error).
+
+    Daemon threads, a call in flight never delays the exit.
+    """
+    results = {}
+
+    def run(name, call):
+        try:
+            results[name] = (call(), None)
+        except Exception as e:
+            results[name] = (None, e)
+
+    threads = [
+        Thread(target=run, args=(name, call), name=name, daemon=True)
+        for name, call in calls.items()
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
 def get_percentage_delta(f1, f2):
     """500, 505 => 1% delta"""
     return abs(1 - f1 / f2) * 100
 
 
 class AutoPrice(AutoModule):
+    config_section = "price"
+    requires = ("siad",)
+    interval = 300  # 5min
+    min_interval = 120
+    max_interval = 1800
+
     def __init__(
         self,
         configuration_dictionary: dict,
@@ -42,22 +81,49 @@ class AutoPrice(AutoModule):
 
         self.minimum_price = float(minimum_price)
         self.collateral_factor = float(collateral_factor)
+        self.controller = get_controller(configuration_dictionary)
+        # Solve the hostdb rank price in one step
+        self.solver = bool(configuration_dictionary.get("solver", False))
+        self.convergence = ConvergenceTracker(self.controller.deadband)
+        # Ranks of hostdb and siastats are different scales,
+        # both sources at once need a controller and tracker each
+        self.source_control = {
+            source: (
+                get_controller(configuration_dictionary),
+                ConvergenceTracker(self.controller.deadband),
+            )
+            for source in ('hostdb', 'siastats')
+        }
+        self.trusted_source = None
 
         self.usd = None
         self.siastats_rank = None
         self.hostdb_rank = None
 
+        # Do not poll hostdb or siastats while siad is down
+        self.follow_siad_state()
+
         if usd:
             self.usd = float(usd)
+            self.rate = get_cached_rate(
+                configuration_dictionary.get("usd-rate")
+            )
             return
 
         if siastats_rank:
             self.siastats_rank = int(siastats_rank)
-            return
+            self.siastats = Siastats(
+                self.siad,
+                cache_path=configuration_dictionary.get(
+                    "siastats-cache-file", "siastats-host.json"
+                ) or None,
+                hosts_ttl=float(
+                    configuration_dictionary.get("siastats-hosts-ttl", 3600)
+                ),
+            )
 
         if hostdb_rank:
             self.hostdb_rank = int(hostdb_rank)
-            return
 
     @property
     def name(self) -> str:
@@ -67,13 +133,25 @@ class AutoPrice(AutoModule):
         self.print("Module enabled")
         self.print("Collateral factor: {}".format(self.collateral_factor))
         self.print("Minimum price: {}SC".format(self.minimum_price))
+        self.print("Price controller: {}".format(
+            type(self.controller).__name__
+        ))
         if self.usd:
             self.print(
                 "Keep price at ${}".format(self.usd)
             )
+        elif self.hostdb_rank and self.siastats_rank:
+            self.print(
+                "Set price to target hostdb rank #{} or siastats rank #{}, "
+                "whichever is up to date".format(
+                    self.hostdb_rank, self.siastats_rank
+                )
+            )
         elif self.hostdb_rank:
             self.print(
-                "Set price to target hostdb rank #{}".format(self.hostdb_rank)
+                "Set price to target hostdb rank #{}{}".format(
+                    self.hostdb_rank, " (solver)" if self.solver else ""
+                )
             )
         else:
             self.print(
@@ -81,9 +159,35 @@ class AutoPrice(AutoModule):
             )
 
     def set_by_usd(self):
-        raise NotImplementedError()
+        rate = self.rate.get()
+        if rate is None:
+            self.print("Error: No Siacoin/USD rate. Retry later.")
+            return
+        new_price = self.usd / rate
+        self.print(
+            "Siacoin at ${:.5f} ({:.0f}s old), ${} is {:.2f}SC"
+            .format(rate, self.rate.age, self.usd, new_price)
+        )
+
+        current_price = self.siad.storage_price
+        if get_percentage_delta(new_price, current_price) <= 0.5:
+            # Not worth a host announcement
+            return
+        self.set_price(current_price, new_price)
+
+    def set_price(self, current_price, new_price):
+        new_price = max(self.minimum_price, new_price)
+        if new_price == current_price:
+            return
+        self.state_changed()
+        self.print("New price: {:.2f}SC".format(new_price))
+
+        with self.siad.batch_host():
+            self.siad.storage_price = new_price
+            self.siad.collateral = new_price * self.collateral_factor
+        self.publish(PRICE_CHANGED, old=current_price, new=new_price)
 
-    def set_price_by_rank_delta(self, delta):
+    def set_price_by_rank_delta(self, delta, controller=None, convergence=None):
         """-3 means, we have to rank better.
         +3 means we have to rank worse.
         
@@ -91,14 +195,14 @@ class AutoPrice(AutoModule):
         So the delta to move is +3. We have to rank worse,
         meaning increase the price.
         """
+        controller = controller or self.controller
+        convergence = convergence or self.convergence
         self.print("Rank delta to move: {}".format(delta))
+        self.print(convergence.update(delta))
         current_price = self.siad.storage_price
-        new_price = current_price * 1.01 ** delta
-        new_price = max(self.minimum_price, new_price)
-        self.print("New price: {:.2f}SC".format(new_price))
-
-        self.siad.storage_price = new_price
-        self.siad.collateral = new_price * self.collateral_factor
+        self.set_price(
+            current_price, controller.next_price(current_price, delta)
+        )
 
     def set_by_hostdb(self):
         rank_price = self.siad.get_hostdb_rank_and_price()
@@ -117,15 +221,56 @@ class AutoPrice(AutoModule):
                 "Hostdb not up to date. Actual price: {:.2f}SC. Retry later."
                 .format(current_price)
             )
+            # Our last price change is still propagating
+            self.state_changed()
             return
 
         rank_delta = self.hostdb_rank - rank
         self.set_price_by_rank_delta(rank_delta)
 
+    def solve_by_hostdb(self):
+        """Jump to the price of the target rank.
+
+        Works with a hostdb which has not seen our last price yet,
+        the model is calibrated with the price the hostdb knows.
+        """
+        market = self.siad.get_hostdb_market()
+        if market is None:
+            self.print("Error: Could not get host rank. Hostdb not up to date?")
+            return
+
+        rank, price, competitor_prices = market
+        if not competitor_prices:
+            self.print("Error: No other hosts in the hostdb")
+            return
+        self.print("Hostdb current rank #{} with {:.2f}SC".format(rank, price))
+
+        model = RankModel(competitor_prices, price, rank)
+        new_price = model.solve(
+            self.hostdb_rank,
+            low=self.minimum_price,
+            high=max(competitor_prices) * 2,
+        )
+        self.print(
+            "Modelled rank #{} at {:.2f}SC"
+            .format(model.rank(new_price), new_price)
+        )
+        self.print(self.convergence.update(self.hostdb_rank - rank))
+
+        current_price = self.siad.storage_price
+        if get_percentage_delta(new_price, current_price) <= 0.1:
+            # Already set, waiting for the hostdb
+            return
+        self.set_price(current_price, new_price)
+
     def set_by_siastats(self):
-        siastats = Siastats(self.siad)
-        siastats_actual_rank = siastats.rank
-        price = siastats.storage_price
+        try:
+            host = self.siastats.host
+        except LookupError as e:
+            self.print("Error: {}".format(e))
+            return
+        siastats_actual_rank = host['rank']
+        price = host['storagePrice']
 
         self.print(
             "Siastats current rank #{} with {:.2f}SC"
@@ -140,17 +285,88 @@ class AutoPrice(AutoModule):
                 "Siastats not up to date. Actual price: {:.2f}SC. Retry later."
                 .format(current_price)
             )
+            # Our last price change is still propagating
+            self.state_changed()
             return
 
         rank_delta = self.siastats_rank - siastats_actual_rank
         self.set_price_by_rank_delta(rank_delta)
 
-    def _run(self):
-        while True:
-            if self.usd:
-                self.set_by_usd()
-            elif self.hostdb_rank:
-                self.set_by_hostdb()
+    def siastats_rank_and_price(self):
+        host = self.siastats.host
+        return (host['rank'], host['storagePrice'])
+
+    def fetch_sources(self) -> dict:
+        """Our price and the rank sources, queried concurrently.
+
+        name => result, or the error of a failed rank source.
+        """
+        calls = {
+            'price': lambda: self.siad.storage_price,
+            'hostdb': self.siad.get_hostdb_rank_and_price,
+            'siastats': self.siastats_rank_and_price,
+        }
+        results = {}
+        for name, (result, error) in call_concurrently(calls).items():
+            if error is None:
+                results[name] = result
+            elif name != 'price' and isinstance(error, SOURCE_ERRORS):
+                results[name] = error
             else:
-                self.set_by_siastats()
-            sleep(300)  # 5min
+                raise error
+        return results
+
+    def set_by_sources(self):
+        """Trust the first rank source which has seen our price."""
+        start = monotonic()
+        results = self.fetch_sources()
+        self.print("Fetched rank sources in {:.2f}s".format(monotonic() - start))
+        current_price = results['price']
+
+        targets = (
+            ('hostdb', self.hostdb_rank),
+            ('siastats', self.siastats_rank),
+        )
+        for name, target in targets:
+            result = results[name]
+            if result is None or isinstance(result, Exception):
+                self.print("Error: No {} rank: {}".format(name, result))
+                continue
+
+            rank, price = result
+            self.print(
+                "{} current rank #{} with {:.2f}SC".format(name, rank, price)
+            )
+            if get_percentage_delta(price, current_price) > 0.1:
+                self.print("{} not up to date".format(name))
+                continue
+
+            self.print("Going by {}".format(name))
+            controller, convergence = self.source_control[name]
+            if name != self.trusted_source:
+                # Its history misses the steps taken by the other source
+                controller.reset()
+                self.trusted_source = name
+            self.set_price_by_rank_delta(target - rank, controller, convergence)
+            return
+
+        self.print(
+            "No rank source up to date. Actual price: {:.2f}SC. Retry later."
+            .format(current_price)
+        )
+        # Our last price change is still propagating
+        self.state_changed()
+
+    def tick(self):
+        if self.siad_down:
+            return
+        if self.usd:
+            self.set_by_usd()
+        elif self.hostdb_rank and self.siastats_rank:
+            self.set_by_sources()
+        elif self.hostdb_rank and self.solver:
+            self.solve_by_hostdb()
+        elif self.hostdb_rank:
+            self.set_by_hostdb()
+        else:
+            self.set_by_siastats()
@@ -1,19 +1,43 @@
-from time import sleep
-from subprocess import call
 from .automodule import AutoModule
+from .circuitbreaker import CircuitOpenError
+from .events import SIAD_DOWN, SIAD_RESTARTED, SIAD_UP
+from .apischeduler import CRITICAL
 from .siad import Siad
 
+# Restart after an error for 300 seconds
+ERROR_HITS_MAX = 60
+
+# Phases of the restart routine
+WATCHING = "watching"
+STOPPED = "stopped"
+COOLDOWN = "cooldown"
+
 
 class AutoRestart(AutoModule):
+    config_section = "restart"
+    requires = ("siad",)
+    interval = 5
+    min_interval = 5
+    max_interval = 30
+    # Probing a dead siad takes up to the connection timeouts
+    deadline = 60
+
     def __init__(self, configuration_dictionary: dict, siad: Siad):
         self.siad = siad
         self.stop_commands = configuration_dictionary.get("stop-commands", [])
         sleep_duration = configuration_dictionary.get("sleep", "0")
         self.start_commands = configuration_dictionary.get("start-commands", [])
         cooldown = configuration_dictionary.get("cooldown", "0")
+        command_timeout = configuration_dictionary.get("command-timeout", "100")
 
         self.sleep = float(sleep_duration)
         self.cooldown = float(cooldown)
+        self.command_timeout = float(command_timeout)
+        self.error_hits = 0
+        self.phase = WATCHING
+        # Published SIAD_DOWN, publish SIAD_UP on the next success.
+        # Outlives error_hits, which restarts count from 0.
+        self.siad_is_down = False
 
     @property
     def name(self) -> str:
@@ -36,36 +60,58 @@ class AutoRestart(AutoModule):
 
     def run_shell_command(self, command):
         self.print("Running command: $ {}".format(command))
-        exit_code = call(command, shell=True)
+        exit_code = self.run_command(command, self.command_timeout)
         self.print("Exit code: {}".format(exit_code))
 
-    def _run(self):
-        while True:
-            # After an error for 300 seconds
-            run_restart_after_minutes = 5
-            error_hits_max = 60
-
-            error_hits = 0
-            while error_hits < error_hits_max:
-                try:
-                    self.siad.get_host()
-                    if error_hits > 0:
-                        self.print("Siad reached successfully. Reset failure counter.")
-                    error_hits = 0
-                except Exception as e:
-                    self.print("Siad failure {}/{} ({})".format(error_hits + 1, error_hits_max, e))
-                    error_hits += 1
-                sleep(run_restart_after_minutes)
-
-            self.print("Start offline restart routine")
-            for stop_command in self.stop_commands:
-                self.run_shell_command(stop_command)
-    
-            self.print("Sleep after stop commands for {}s".format(self.sleep))
-            sleep(self.sleep)
+    def check_siad(self, probe_interval: float):
+        """Raise if siad is down.
 
+        The circuit breaker is shared with all other modules, so only
+        probe siad if nobody reached it within probe_interval.
+        """
+        breaker = self.siad.breaker
+        if breaker.is_open:
+            raise CircuitOpenError("circuit breaker is open")
+        if breaker.seconds_since_success < probe_interval:
+            return
+        with self.siad.priority(CRITICAL):
+            self.siad.get_host(fresh=True)
+
+    def tick(self):
+        if self.phase == STOPPED:
             for start_command in self.start_commands:
                 self.run_shell_command(start_command)
-
             self.print("Cooldown after starting for {}s".format(self.cooldown))
-            sleep(self.cooldown)
+            self.phase = COOLDOWN
+            self.state_changed()
+            self.publish(SIAD_RESTARTED)
+            return self.cooldown
+
+        self.phase = WATCHING
+        try:
+            self.check_siad(self.min_interval)
+            if self.siad_is_down:
+                self.print("Siad reached successfully. Reset failure counter.")
+                self.siad_is_down = False
+                self.state_changed()
+                self.publish(SIAD_UP)
+            self.error_hits = 0
+        except Exception as e:
+            self.print("Siad failure {}/{} ({})".format(self.error_hits + 1, ERROR_HITS_MAX, e))
+            if not self.siad_is_down:
+                self.siad_is_down = True
+                self.publish(SIAD_DOWN, error=str(e))
+            self.error_hits += 1
+            self.state_changed()
+
+        if self.error_hits < ERROR_HITS_MAX:
+            return
+
+        self.error_hits = 0
+        self.print("Start offline restart routine")
+        for stop_command in self.stop_commands:
+            self.run_shell_command(stop_command)
+
+        self.print("Sleep after stop commands for {}s".format(self.sleep))
+        self.phase = STOPPED
+        return self.sleep
@@ -1,9 +1,10 @@
 from sys import exit
-from time import sleep, time
-from subprocess import call
+from time import time
 from threading import Thread
 from .automodule import AutoModule
+from .events import SPEEDTEST_DONE
 from .speedtest import Speedtest
+from . import shutdown
 
 
 def average(array: list) -> float:
@@ -45,7 +46,8 @@ class NetworkWatcher:
         bytes_tx = get_bytes_tx(self.interface)
 
         while not self._stop:
-            sleep(self.interval)
+            if shutdown.wait(self.interval):
+                return
             pre_check_time = time()
             new_bytes_rx = get_bytes_rx(self.interface)
             new_bytes_tx = get_bytes_tx(self.interface)
@@ -76,7 +78,7 @@ class NetworkWatcher:
 
 
 def perform_speed_test(interface: str) -> (int, int):
-    s = Speedtest()
+    s = Speedtest(shutdown_event=shutdown.event)
     s.get_best_server()
 
     network_watcher = NetworkWatcher(interface)
@@ -91,6 +93,8 @@ def perform_speed_test(interface: str) -> (int, int):
 
 
 class AutoThrottle(AutoModule):
+    config_section = "throttle"
+
     def __init__(self, configuration_dictionary: dict):
         self.interface = configuration_dictionary.get("interface")
         self.throttle_command = configuration_dictionary.get("throttle-command")
@@ -98,6 +102,7 @@ class AutoThrottle(AutoModule):
         interval = configuration_dictionary.get("interval")
         upload_factor = configuration_dictionary.get("up")
         download_factor = configuration_dictionary.get("down")
+        command_timeout = configuration_dictionary.get("command-timeout", 60)
 
         if not self.interface:
             self.print("Configuration key 'interface' is missing.")
@@ -119,6 +124,7 @@ class AutoThrottle(AutoModule):
             exit(1)
 
         self.interval = float(interval)
+        self.command_timeout = float(command_timeout)
         self.upload_factor = float(upload_factor)
         self.download_factor = float(download_factor)
 
@@ -141,10 +147,11 @@ class AutoThrottle(AutoModule):
         unthrottle_command = self.unthrottle_command.format(
             interface=self.interface
         )
-        unthrottle_exit = call(unthrottle_command, shell=True)
+        unthrottle_exit = self.run_command(unthrottle_command, self.command_timeout)
         self.print('Unthrottle exit code: {}'.format(unthrottle_exit))
 
         bps_up, bps_down = perform_speed_test(self.interface)
+        self.heartbeat()
         self.print(
             "Measured up: {}Mbits, down: {}Mbits"
             .format(
@@ -152,6 +159,7 @@ class AutoThrottle(AutoModule):
                 bps_down / 1000 / 1000,
             )
         )
+        self.publish(SPEEDTEST_DONE, bps_up=bps_up, bps_down=bps_down)
         target_bps_up = round(bps_up * self.upload_factor)
         target_bps_down = round(bps_down * self.download_factor)
 
@@ -167,10 +175,8 @@ class AutoThrottle(AutoModule):
             interface=self.interface,
         )
         self.print("$ {}".format(throttle_command))
-        throttle_exit = call(throttle_command, shell=True)
+        throttle_exit = self.run_command(throttle_command, self.command_timeout)
         self.print("Throttle exit code: {}".format(throttle_exit))
 
-    def _run(self):
-        while True:
-            self.perform_speedtest_and_trottle()
-            sleep(self.interval)
+    def tick(self):
+        self.perform_speedtest_and_trottle()
@@ -1,8 +1,17 @@
-from time import sleep
 from .automodule import AutoModule
+from .events import SIAD_RESTARTED, WALLET_LOCKED, WALLET_UNLOCKED
+from .apischeduler import CRITICAL
 from .siad import Siad, Result
 
 class AutoUnlock(AutoModule):
+    config_section = "unlock"
+    requires = ("siad",)
+    interval = 10
+    min_interval = 5
+    max_interval = 60
+    # Unlocking takes a while on big wallets
+    deadline = 120
+
     def __init__(self, configuration_dictionary: dict, siad: Siad):
         self.password = configuration_dictionary.get("wallet-password", None)
         self.siad = siad
@@ -13,6 +22,10 @@ class AutoUnlock(AutoModule):
                 "parameter 'wallet-password'."
             )
 
+        # A restarted siad comes up with a locked wallet
+        self.subscribe(SIAD_RESTARTED, lambda event: self.wake())
+        self.follow_siad_state()
+
     @property
     def name(self) -> str:
         return "AutoUnlock"
@@ -21,13 +34,18 @@ class AutoUnlock(AutoModule):
         self.print("Module enabled")
 
     def unlock(self):
+        self.state_changed()
         if self.siad.unlock_wallet(self.password) == Result.FAILURE:
             self.print("Failed unlocking the wallet. Retrying...")
         else:
             self.print("Unlocked Wallet")
+            self.publish(WALLET_UNLOCKED)
 
-    def _run(self):
-        while True:
-            if not self.siad.wallet_unlocked:
-                self.unlock()
-            sleep(10)
+    def tick(self):
+        if self.siad_down:
+            return
+        with self.siad.priority(CRITICAL):
+            unlocked = self.siad.wallet_unlocked
+        if not unlocked:
+            self.publish(WALLET_LOCKED)
+            self.unlock()
@@ -0,0 +1,92 @@
+"""Fail fast while siad is unreachable."""
+from random import uniform
+from threading import Lock
+from time import monotonic
+from requests.exceptions import ConnectionError
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+
+class CircuitOpenError(ConnectionError):
+    """Raised instead of calling siad while the circuit is open."""
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Full jitter exponential backoff, attempt counts from 0."""
+    return uniform(0, min(cap, base * 2 ** attempt))
+
+
+class CircuitBreaker:
+    """Shared by all modules, counts consecutive connection failures.
+
+    After failure_threshold failures the circuit opens and calls fail
+    fast. After reset_timeout seconds a single trial call is let
+    through, its outcome closes or reopens the circuit.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self._last_success = None
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == OPEN and self._reset_due():
+                return HALF_OPEN
+            return self._state
+
+    @property
+    def is_open(self) -> bool:
+        """True while calls fail fast."""
+        return self.state == OPEN
+
+    @property
+    def seconds_since_success(self) -> float:
+        with self._lock:
+            if self._last_success is None:
+                return float('inf')
+            return monotonic() - self._last_success
+
+    def _reset_due(self) -> bool:
+        return monotonic() - self._opened_at >= self.reset_timeout
+
+    def before_call(self):
+        """Raise CircuitOpenError if the call must not be made."""
+        with self._lock:
+            if self._state == CLOSED:
+                return
+            if self._state == OPEN and self._reset_due():
+                self._state = HALF_OPEN
+            if self._state == HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return
+            raise CircuitOpenError(
+                "Circuit open after {} failures, siad considered down"
+                .format(self._failures)
+            )
+
+    def record_success(self):
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._trial_running = False
+            self._last_success = monotonic()
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if (
+                self._state == HALF_OPEN
+                or self._failures >= self.failure_threshold
+            ):
+                self._state = OPEN
+                self._opened_at = monotonic()
@@ -0,0 +1,110 @@
+"""Watch config.yaml, with inotify on Linux or by polling its mtime."""
+import ctypes
+import ctypes.util
+import os
+import struct
+import traceback
+from select import select
+from threading import Thread
+from . import shutdown
+
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_CLOEXEC = 0o2000000
+
+EVENT_HEADER = struct.Struct("iIII")
+
+# Editors write in several steps, wait until they are done
+DEBOUNCE = 0.2
+
+
+def _inotify_fd(directory: str):
+    """inotify descriptor watching directory, None if unavailable."""
+    libc_name = ctypes.util.find_library("c")
+    if not libc_name:
+        return None
+    try:
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        fd = libc.inotify_init1(IN_CLOEXEC)
+    except (OSError, AttributeError):
+        return None
+    if fd < 0:
+        return None
+    mask = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+    if libc.inotify_add_watch(fd, os.fsencode(directory), mask) < 0:
+        os.close(fd)
+        return None
+    return fd
+
+
+def _names(buffer: bytes):
+    """File names of the inotify events in buffer."""
+    offset = 0
+    while offset < len(buffer):
+        _, _, _, length = EVENT_HEADER.unpack_from(buffer, offset)
+        offset += EVENT_HEADER.size
+        yield buffer[offset:offset + length].rstrip(b"\0")
+        offset += length
+
+
+class ConfigWatcher:
+    """Call callback() after path changed, until shutdown."""
+
+    def __init__(self, path: str, callback, poll_interval: float = 2):
+        self.path = os.path.abspath(path)
+        self.callback = callback
+        self.poll_interval = poll_interval
+        self.thread = Thread(target=self.watch, name="config-watch", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def changed(self):
+        """Call callback, one failed reload never stops the watching."""
+        try:
+            self.callback()
+        except Exception:
+            print("Config reload failed, still watching {}:".format(self.path))
+            traceback.print_exc()
+
+    def watch(self):
+        fd = _inotify_fd(os.path.dirname(self.path))
+        if fd is None:
+            self.watch_mtime()
+            return
+        try:
+            self.watch_inotify(fd)
+        finally:
+            os.close(fd)
+
+    def watch_inotify(self, fd: int):
+        name = os.fsencode(os.path.basename(self.path))
+        while not shutdown.is_set():
+            readable, _, _ = select([fd], [], [], 0.5)
+            if not readable:
+                continue
+            if name not in _names(os.read(fd, 64 * 1024)):
+                continue
+            if shutdown.wait(DEBOUNCE):
+                return
+            # Drop the events of the rest of the write
+            while select([fd], [], [], 0)[0]:
+                os.read(fd, 64 * 1024)
+            self.changed()
+
+    def _stat(self):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def watch_mtime(self):
+        last = self._stat()
+        while not shutdown.wait(self.poll_interval):
+            current = self._stat()
+            if current != last:
+                last = current
+                self.changed()
@@ -0,0 +1,84 @@
+"""In-process publish/subscribe, so modules react instead of poll."""
+import traceback
+from threading import Lock
+from time import time
+
+SIAD_DOWN = "siad_down"
+SIAD_UP = "siad_up"
+SIAD_RESTARTED = "siad_restarted"
+WALLET_LOCKED = "wallet_locked"
+WALLET_UNLOCKED = "wallet_unlocked"
+PRICE_CHANGED = "price_changed"
+SPEEDTEST_DONE = "speedtest_done"
+MODULE_FAILED = "module_failed"
+MODULE_STUCK = "module_stuck"
+
+EVENTS = (
+    SIAD_DOWN,
+    SIAD_UP,
+    SIAD_RESTARTED,
+    WALLET_LOCKED,
+    WALLET_UNLOCKED,
+    PRICE_CHANGED,
+    SPEEDTEST_DONE,
+    MODULE_FAILED,
+    MODULE_STUCK,
+)
+
+
+class Event:
+    def __init__(self, name: str, data: dict):
+        self.name = name
+        self.data = data
+        self.timestamp = time()
+
+    def __str__(self) -> str:
+        return "{} {}".format(self.name, self.data)
+
+
+class EventBus:
+    """Call subscribers synchronously in the publishing thread.
+
+    Callbacks must be quick, i.e. set a flag or wake a module.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._subscribers = {}
+        self._last = {}
+
+    def subscribe(self, name: str, callback):
+        if name not in EVENTS:
+            raise ValueError("Unknown event '{}'".format(name))
+        with self._lock:
+            self._subscribers.setdefault(name, []).append(callback)
+
+    def unsubscribe(self, name: str, callback):
+        with self._lock:
+            callbacks = self._subscribers.get(name, [])
+            if callback in callbacks:
+                callbacks.remove(callback)
+
+    def publish(self, name: str, **data) -> Event:
+        if name not in EVENTS:
+            raise ValueError("Unknown event '{}'".format(name))
+        event = Event(name, data)
+        with self._lock:
+            self._last[name] = event
+            callbacks = list(self._subscribers.get(name, []))
+        for callback in callbacks:
+            try:
+                callback(event)
+            except Exception:
+                print("Error in subscriber of event {}:".format(name))
+                traceback.print_exc()
+        return event
+
+    def last(self, name: str) -> Event:
+        """The last published event of that name, or None."""
+        with self._lock:
+            return self._last.get(name)
+
+
+# Shared by all modules of the process
+bus = EventBus()
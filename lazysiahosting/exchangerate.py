@@ -0,0 +1,199 @@
+"""Siacoin/USD exchange rate for USD pegged prices.
+
+A RateProvider fetches the rate, CachedRate keeps it in memory and
+on disk. A stale rate is returned right away and refreshed in the
+background, so a slow exchange API never blocks a price update.
+"""
+import json
+import os
+from threading import Lock, Thread
+from time import time
+from requests import get
+from requests.exceptions import RequestException
+from .singleflight import SingleFlight
+
+COINGECKO_URL = (
+    "https://api.coingecko.com/api/v3/simple/price"
+    "?ids=siacoin&vs_currencies=usd"
+)
+COINGECKO_PATH = "siacoin.usd"
+
+# Errors of a failed fetch, the last rate is kept
+RATE_ERRORS = (RequestException, OSError, ValueError, KeyError, TypeError)
+
+
+def _dig(document, path: str) -> float:
+    """{'siacoin': {'usd': 0.003}}, 'siacoin.usd' => 0.003"""
+    for key in path.split("."):
+        if key:
+            document = document[key]
+    return float(document)
+
+
+class RateProvider:
+    """Interface of rate providers, fetch() returns USD per SC."""
+
+    def fetch(self) -> float:
+        raise NotImplementedError()
+
+
+class HTTPRateProvider(RateProvider):
+    """Read the rate from a json API, coingecko by default."""
+
+    def __init__(
+        self,
+        url: str = COINGECKO_URL,
+        path: str = COINGECKO_PATH,
+        timeout: float = 10,
+    ):
+        self.url = url
+        self.path = path
+        self.timeout = timeout
+
+    def fetch(self) -> float:
+        res = get(self.url, timeout=self.timeout)
+        res.raise_for_status()
+        return _dig(res.json(), self.path)
+
+
+class FileRateProvider(RateProvider):
+    """Read the rate from a file, a bare number or json.
+
+    A stand-in for the exchange API, i.e. for testing.
+    """
+
+    def __init__(self, path: str, json_path: str = ""):
+        self.path = path
+        self.json_path = json_path
+
+    def fetch(self) -> float:
+        with open(self.path) as f:
+            content = f.read()
+        if not self.json_path:
+            return float(content)
+        return _dig(json.loads(content), self.json_path)
+
+
+class CachedRate:
+    """Rate of a provider, fetched at most once per ttl seconds.
+
+    Older than ttl, the rate is still returned and refreshed in the
+    background (stale while revalidate). Older than max_age, it is
+    refreshed before returning. Concurrent refreshes are coalesced.
+    The rate survives restarts in cache_path.
+    """
+
+    def __init__(
+        self,
+        provider: RateProvider,
+        ttl: float = 600,
+        max_age: float = 86400,
+        cache_path: str = None,
+    ):
+        self.provider = provider
+        self.ttl = ttl
+        self.max_age = max_age
+        self.cache_path = cache_path
+        self.single_flight = SingleFlight()
+        self._lock = Lock()
+        self._refreshing = False
+        self.rate = None
+        self.timestamp = None
+        self._load()
+
+    @property
+    def age(self) -> float:
+        """Seconds since the rate was fetched, None without a rate."""
+        if self.timestamp is None:
+            return None
+        return time() - self.timestamp
+
+    def _load(self):
+        if not self.cache_path:
+            return
+        try:
+            with open(self.cache_path) as f:
+                cached = json.load(f)
+            self.rate = float(cached["rate"])
+            self.timestamp = float(cached["timestamp"])
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print("Ignoring exchange rate cache {}: {}".format(self.cache_path, e))
+
+    def _save(self):
+        if not self.cache_path:
+            return
+        # Write aside and rename, a crash never leaves half a file
+        temporary = self.cache_path + ".tmp"
+        try:
+            with open(temporary, "w") as f:
+                json.dump({"rate": self.rate, "timestamp": self.timestamp}, f)
+            os.replace(temporary, self.cache_path)
+        except OSError as e:
+            print("Could not write exchange rate cache {}: {}".format(
+                self.cache_path, e
+            ))
+
+    def _fetch(self) -> float:
+        rate = self.provider.fetch()
+        if rate <= 0:
+            raise ValueError("Exchange rate {} is not positive".format(rate))
+        with self._lock:
+            self.rate = rate
+            self.timestamp = time()
+        self._save()
+        return rate
+
+    def refresh(self) -> float:
+        return self.single_flight.do('rate', self._fetch)
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self.refresh()
+            except RATE_ERRORS as e:
+                print("Could not refresh exchange rate: {}".format(e))
+            finally:
+                with self._lock:
+                    self._refreshing = False
+
+        Thread(target=run, name="exchange-rate", daemon=True).start()
+
+    def get(self) -> float:
+        """USD per SC, None if there is no rate which is recent enough."""
+        age = self.age
+        if age is not None and age < self.ttl:
+            return self.rate
+        if age is not None and age < self.max_age:
+            self._refresh_in_background()
+            return self.rate
+        try:
+            return self.refresh()
+        except RATE_ERRORS as e:
+            print("Could not fetch exchange rate: {}".format(e))
+            return None
+
+
+def get_cached_rate(config: dict) -> CachedRate:
+    """Build the rate of the usd-rate part of the price section."""
+    config = config or {}
+    if config.get("file"):
+        provider = FileRateProvider(config["file"], config.get("path", ""))
+    else:
+        provider = HTTPRateProvider(
+            url=config.get("url", COINGECKO_URL),
+            path=config.get("path", COINGECKO_PATH),
+            timeout=float(config.get("timeout", 10)),
+        )
+    return CachedRate(
+        provider,
+        ttl=float(config.get("ttl", 600)),
+        max_age=float(config.get("max-age", 86400)),
+        cache_path=config.get("cache-file", "exchange-rate.json") or None,
+    )
@@ -0,0 +1,319 @@
+"""A local siad emulator for tests and benchmarks.
+
+Implements the parts of the siad API this project uses, with
+configurable hostdb size, latency, failure rate and unlock delay.
+
+    python3 -m lazysiahosting.fakesiad --port 9980 --hosts 5000
+"""
+import json
+import random
+from argparse import ArgumentParser
+from base64 import b64decode
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from time import sleep
+from urllib.parse import parse_qsl, urlsplit
+from .siad import big_price_to_tiny_price, siacoin_to_hastings
+
+WALLET_PASSWORD = "password"
+NETADDRESS = "fake.host:9982"
+
+
+class FakeSiadState:
+    """Mutable state of the emulated daemon, shared by all handlers."""
+
+    def __init__(
+        self,
+        hosts: int = 500,
+        api_password: str = "",
+        wallet_password: str = WALLET_PASSWORD,
+        unlock_delay: float = 0,
+        balance: float = 10000,
+        storage_price: float = 100,
+        seed: int = 0,
+    ):
+        self.lock = Lock()
+        self.api_password = api_password
+        self.wallet_password = wallet_password
+        self.unlock_delay = unlock_delay
+        self.unlocked = False
+        self.balance_hastings = int(siacoin_to_hastings(balance))
+        self.height = 0
+        self.internalsettings = {
+            "acceptingcontracts": True,
+            "minstorageprice": str(big_price_to_tiny_price(storage_price)),
+            "collateral": str(big_price_to_tiny_price(storage_price * 2)),
+        }
+        self.publickey = {"algorithm": "ed25519", "key": "f" * 64}
+        self.host_writes = 0
+
+        generator = random.Random(seed)
+        self.competitors = [
+            {
+                "netaddress": "host{}.example:9982".format(i),
+                "publickey": {
+                    "algorithm": "ed25519",
+                    "key": "{:064x}".format(i),
+                },
+                "storageprice": str(big_price_to_tiny_price(
+                    generator.uniform(10, 1000)
+                )),
+                "acceptingcontracts": True,
+            }
+            for i in range(hosts)
+        ]
+
+    def host(self) -> dict:
+        return {
+            "externalsettings": {
+                "netaddress": NETADDRESS,
+                "storageprice": self.internalsettings["minstorageprice"],
+                "collateral": self.internalsettings["collateral"],
+            },
+            "internalsettings": dict(self.internalsettings),
+            "publickey": self.publickey,
+        }
+
+    def hostdb_active(self) -> dict:
+        """Sorted worst (most expensive) to best, like siad."""
+        own = {
+            "netaddress": NETADDRESS,
+            "publickey": self.publickey,
+            "storageprice": self.internalsettings["minstorageprice"],
+            "acceptingcontracts": True,
+        }
+        hosts = sorted(
+            self.competitors + [own],
+            key=lambda h: int(h["storageprice"]),
+            reverse=True,
+        )
+        return {"hosts": hosts}
+
+    def wallet(self) -> dict:
+        return {
+            "unlocked": self.unlocked,
+            "confirmedsiacoinbalance": str(self.balance_hastings),
+        }
+
+    def consensus(self) -> dict:
+        return {
+            "synced": True,
+            "height": self.height,
+            "siacoinprecision": str(10 ** 24),
+        }
+
+
+class FakeSiadHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "FakeSiad"
+    # Headers and body are written separately, avoid delayed ACK stalls
+    disable_nagle_algorithm = True
+
+    @property
+    def state(self) -> FakeSiadState:
+        return self.server.state
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def send_json(self, status: int, document):
+        body = json.dumps(document).encode() if document is not None else b""
+        self.send_response(status)
+        if body:
+            self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_error_message(self, status: int, message: str):
+        self.send_json(status, {"message": message})
+
+    def authorized(self) -> bool:
+        if not self.state.api_password:
+            return True
+        header = self.headers.get("Authorization", "")
+        if not header.startswith("Basic "):
+            return False
+        _, _, password = b64decode(header[6:]).decode().partition(":")
+        return password == self.state.api_password
+
+    def handle_request(self, method: str):
+        url = urlsplit(self.path)
+        params = dict(parse_qsl(url.query))
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            params.update(parse_qsl(self.rfile.read(length).decode()))
+
+        if self.server.latency:
+            sleep(self.server.latency)
+
+        if self.headers.get("User-Agent") != "Sia-Agent":
+            return self.send_error_message(400, "Browser access disabled")
+        if not self.authorized():
+            return self.send_error_message(401, "API authentication failed")
+        if random.random() < self.server.failure_rate:
+            return self.send_error_message(500, "injected failure")
+
+        route = self.server.routes.get((method, url.path))
+        if route is None:
+            return self.send_error_message(404, "404 page not found")
+        route(self, params)
+
+    def do_GET(self):
+        self.handle_request("GET")
+
+    def do_POST(self):
+        self.handle_request("POST")
+
+    def get_host(self, params):
+        with self.state.lock:
+            self.send_json(200, self.state.host())
+
+    def post_host(self, params):
+        with self.state.lock:
+            for key, value in params.items():
+                if key not in self.state.internalsettings:
+                    return self.send_error_message(
+                        400, "unrecognized parameter {}".format(key)
+                    )
+            self.state.internalsettings.update(params)
+            self.state.host_writes += 1
+        self.send_json(204, None)
+
+    def get_wallet(self, params):
+        with self.state.lock:
+            self.send_json(200, self.state.wallet())
+
+    def post_wallet_unlock(self, params):
+        if params.get("encryptionpassword") != self.state.wallet_password:
+            return self.send_error_message(
+                500, "provided encryption key is incorrect"
+            )
+        with self.state.lock:
+            if self.state.unlocked:
+                return self.send_error_message(
+                    500, "wallet has already been unlocked"
+                )
+        sleep(self.state.unlock_delay)
+        with self.state.lock:
+            self.state.unlocked = True
+        self.send_json(204, None)
+
+    def post_wallet_lock(self, params):
+        with self.state.lock:
+            self.state.unlocked = False
+        self.send_json(204, None)
+
+    def post_wallet_siacoins(self, params):
+        with self.state.lock:
+            if not self.state.unlocked:
+                return self.send_error_message(500, "wallet must be unlocked")
+            amount = int(params.get("amount", 0))
+            if amount > self.state.balance_hastings:
+                return self.send_error_message(500, "unable to fund transaction")
+            self.state.balance_hastings -= amount
+        self.send_json(200, {"transactionids": ["{:064x}".format(
+            random.getrandbits(256)
+        )]})
+
+    def get_consensus(self, params):
+        with self.state.lock:
+            self.send_json(200, self.state.consensus())
+
+    def get_hostdb_active(self, params):
+        with self.state.lock:
+            document = self.state.hostdb_active()
+        self.send_json(200, document)
+
+
+class FakeSiad(ThreadingHTTPServer):
+    """Serve FakeSiadState over HTTP, i.e. for Siad('127.0.0.1:port', ...)."""
+    daemon_threads = True
+
+    def __init__(
+        self,
+        address: tuple = ("127.0.0.1", 0),
+        state: FakeSiadState = None,
+        latency: float = 0,
+        failure_rate: float = 0,
+        verbose: bool = False,
+    ):
+        super().__init__(address, FakeSiadHandler)
+        self.state = state or FakeSiadState()
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.verbose = verbose
+        self.routes = {
+            ("GET", "/host"): FakeSiadHandler.get_host,
+            ("POST", "/host"): FakeSiadHandler.post_host,
+            ("GET", "/wallet"): FakeSiadHandler.get_wallet,
+            ("POST", "/wallet/unlock"): FakeSiadHandler.post_wallet_unlock,
+            ("POST", "/wallet/lock"): FakeSiadHandler.post_wallet_lock,
+            ("POST", "/wallet/siacoins"): FakeSiadHandler.post_wallet_siacoins,
+            ("GET", "/consensus"): FakeSiadHandler.get_consensus,
+            ("GET", "/hostdb/active"): FakeSiadHandler.get_hostdb_active,
+        }
+        self._thread = None
+
+    @property
+    def host(self) -> str:
+        """host:port to pass to Siad."""
+        return "{}:{}".format(*self.server_address[:2])
+
+    def start(self) -> str:
+        """Serve in a background thread, returns host:port."""
+        self._thread = Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self.host
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread:
+            self._thread.join()
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bind", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9980)
+    parser.add_argument("--api-password", default="")
+    parser.add_argument("--wallet-password", default=WALLET_PASSWORD)
+    parser.add_argument("--hosts", type=int, default=500,
+                        help="competitors in /hostdb/active")
+    parser.add_argument("--latency", type=float, default=0,
+                        help="seconds added to every response")
+    parser.add_argument("--failure-rate", type=float, default=0,
+                        help="share of requests answered with HTTP 500")
+    parser.add_argument("--unlock-delay", type=float, default=0,
+                        help="seconds /wallet/unlock takes")
+    parser.add_argument("--balance", type=float, default=10000,
+                        help="confirmed wallet balance in SC")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    state = FakeSiadState(
+        hosts=args.hosts,
+        api_password=args.api_password,
+        wallet_password=args.wallet_password,
+        unlock_delay=args.unlock_delay,
+        balance=args.balance,
+    )
+    server = FakeSiad(
+        (args.bind, args.port),
+        state,
+        latency=args.latency,
+        failure_rate=args.failure_rate,
+        verbose=args.verbose,
+    )
+    print("Fake siad listening on {}".format(server.host))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    server.server_close()
+
+
+if __name__ == "__main__":
+    main()
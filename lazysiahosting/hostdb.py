@@ -0,0 +1,177 @@
+"""Incremental parsing of the siad hostdb.
+
+/hostdb/active is many megabytes on mainnet. Instead of decoding
+the whole document, hosts are decoded one by one from the response
+stream, so memory stays bounded by a single chunk and host.
+"""
+import re
+from codecs import getincrementaldecoder
+from json import JSONDecodeError, JSONDecoder
+
+HOSTS_ARRAY = re.compile(r'"hosts"\s*:\s*\[')
+SEPARATOR = re.compile(r'[\s,]*')
+
+_decoder = JSONDecoder()
+
+
+class ArrayItemParser:
+    """Decode the items of the json array matched by array_start.
+
+    Push chunks of bytes with feed(), which returns the items they
+    completed. done is set once the array is closed.
+    """
+
+    def __init__(self, array_start=HOSTS_ARRAY):
+        self.array_start = array_start
+        self.started = False
+        self.done = False
+        self._text = getincrementaldecoder('utf-8')()
+        self._buffer = ''
+
+    def feed(self, chunk: bytes) -> list:
+        if self.done:
+            return []
+        buffer = self._buffer + self._text.decode(chunk)
+        if not self.started:
+            match = self.array_start.search(buffer)
+            if not match:
+                # Keep the tail, the key might be split between chunks
+                self._buffer = buffer[-32:]
+                return []
+            buffer = buffer[match.end():]
+            self.started = True
+
+        items = []
+        position = 0
+        while True:
+            position = SEPARATOR.match(buffer, position).end()
+            if buffer[position:position + 1] == ']':
+                self.done = True
+                break
+            try:
+                item, position = _decoder.raw_decode(buffer, position)
+            except JSONDecodeError:
+                # Item is split between chunks, wait for the next
+                break
+            items.append(item)
+        self._buffer = '' if self.done else buffer[position:]
+        return items
+
+    def close(self):
+        """Raise JSONDecodeError if the stream ended inside the array."""
+        if self.started and not self.done:
+            raise JSONDecodeError("Expecting ']'", self._buffer, len(self._buffer))
+
+
+def iter_array_items(chunks, array_start=HOSTS_ARRAY):
+    """Yield the items of the json array matched by array_start.
+
+    chunks is an iterable of bytes, i.e. response.iter_content().
+    Stop iterating to stop reading the stream.
+    """
+    parser = ArrayItemParser(array_start)
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+        if parser.done:
+            return
+    # Not found, i.e. {"hosts": null}, is no error, truncated is
+    parser.close()
+
+
+def reduce_fields(host: dict, fields: tuple = None) -> dict:
+    """host with only fields, all of them if fields is None."""
+    if fields is None:
+        return host
+    return {field: host.get(field) for field in fields}
+
+
+def iter_hosts(chunks, fields: tuple = None):
+    """Yield hosts of a /hostdb/active stream, reduced to fields."""
+    for host in iter_array_items(chunks):
+        yield reduce_fields(host, fields)
+
+
+def format_pubkey(publickey: dict) -> str:
+    """{'algorithm': 'ed25519', 'key': 'abc'} => 'ed25519:abc'"""
+    return "{}:{}".format(publickey["algorithm"], publickey["key"])
+
+
+class HostDBEntry:
+    def __init__(self, rank: int, netaddress: str, pubkey: str, storageprice: str):
+        self.rank = rank
+        self.netaddress = netaddress
+        self.pubkey = pubkey
+        self.storageprice = storageprice
+
+
+class _Snapshot:
+    def __init__(
+        self,
+        entries: list,
+        by_netaddress: dict,
+        by_pubkey: dict,
+        timestamp: float,
+    ):
+        self.entries = entries
+        self.by_netaddress = by_netaddress
+        self.by_pubkey = by_pubkey
+        self.timestamp = timestamp
+
+
+class HostDBIndex:
+    """The last hostdb snapshot, indexed by netaddress and public key.
+
+    Lookups are O(1). refresh() builds a new snapshot on the side
+    and swaps it in with a single assignment, so readers in other
+    threads see either the old or the new snapshot, never a mix.
+    """
+    FIELDS = ('netaddress', 'publickey', 'storageprice')
+
+    def __init__(self):
+        self._snapshot = _Snapshot([], {}, {}, None)
+
+    @property
+    def size(self) -> int:
+        return len(self._snapshot.by_netaddress)
+
+    @property
+    def timestamp(self) -> float:
+        """time() of the last refresh, None if never refreshed."""
+        return self._snapshot.timestamp
+
+    def refresh(self, hosts, timestamp: float):
+        """Replace the index by hosts, ordered worst to best like siad."""
+        entries = []
+        for host in hosts:
+            publickey = host.get('publickey')
+            entries.append(HostDBEntry(
+                rank=None,
+                netaddress=host.get('netaddress'),
+                pubkey=format_pubkey(publickey) if publickey else None,
+                storageprice=host.get('storageprice'),
+            ))
+
+        by_netaddress = {}
+        by_pubkey = {}
+        for i, entry in enumerate(entries):
+            # Reversed, #1 is best (#0 does not exist)
+            entry.rank = len(entries) - i
+            by_netaddress[entry.netaddress] = entry
+            if entry.pubkey:
+                by_pubkey[entry.pubkey] = entry
+
+        self._snapshot = _Snapshot(entries, by_netaddress, by_pubkey, timestamp)
+
+    def entries(self) -> list:
+        """All hosts of the snapshot, worst to best."""
+        return self._snapshot.entries
+
+    def lookup(self, netaddress: str = None, pubkey: str = None) -> HostDBEntry:
+        """Find a host by public key, falling back to netaddress."""
+        snapshot = self._snapshot
+        entry = None
+        if pubkey:
+            entry = snapshot.by_pubkey.get(pubkey)
+        if entry is None and netaddress:
+            entry = snapshot.by_netaddress.get(netaddress)
+        return entry
@@ -0,0 +1,112 @@
+"""Per endpoint traffic and latency statistics."""
+from bisect import bisect_left
+from threading import Lock
+
+# Upper bounds of the latency buckets in seconds, 1ms to ~2min
+LATENCY_BUCKETS = tuple(0.001 * 1.5 ** i for i in range(30))
+
+
+def format_seconds(seconds: float) -> str:
+    if seconds < 1:
+        return "{:.0f}ms".format(seconds * 1000)
+    return "{:.1f}s".format(seconds)
+
+
+class EndpointStats:
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.bytes_received = 0
+        self.total_seconds = 0
+        # One counter per bucket, the last one counts everything slower
+        self.histogram = [0] * (len(LATENCY_BUCKETS) + 1)
+
+    def percentile(self, q: float) -> float:
+        """Upper bound of the bucket containing the q-th percentile."""
+        if not self.calls:
+            return 0
+        target = q / 100 * self.calls
+        seen = 0
+        for bucket, count in enumerate(self.histogram):
+            seen += count
+            if seen >= target and count:
+                break
+        if bucket >= len(LATENCY_BUCKETS):
+            return float('inf')
+        return LATENCY_BUCKETS[bucket]
+
+    def as_dict(self) -> dict:
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'bytes': self.bytes_received,
+            'mean': self.total_seconds / self.calls if self.calls else 0,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99),
+        }
+
+
+class RequestMetrics:
+    """Count calls, errors, bytes and latency per (method, endpoint)."""
+
+    def __init__(self):
+        self._lock = Lock()
+        self._stats = {}
+
+    def _get(self, method: str, endpoint: str) -> EndpointStats:
+        key = (method, endpoint.split('?', 1)[0])
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = EndpointStats()
+        return stats
+
+    def record(
+        self,
+        method: str,
+        endpoint: str,
+        seconds: float,
+        bytes_received: int = 0,
+        error: bool = False,
+    ):
+        bucket = bisect_left(LATENCY_BUCKETS, seconds)
+        with self._lock:
+            stats = self._get(method, endpoint)
+            stats.calls += 1
+            stats.errors += int(error)
+            stats.bytes_received += bytes_received
+            stats.total_seconds += seconds
+            stats.histogram[bucket] += 1
+
+    def add_bytes(self, method: str, endpoint: str, bytes_received: int):
+        """Account bytes of a streamed body read after record()."""
+        with self._lock:
+            self._get(method, endpoint).bytes_received += bytes_received
+
+    def snapshot(self) -> dict:
+        """{(method, endpoint): {'calls': ..., 'p95': ...}}"""
+        with self._lock:
+            return {
+                key: stats.as_dict()
+                for key, stats in self._stats.items()
+            }
+
+    def summary(self) -> list:
+        """One human readable line per endpoint, slowest p95 first."""
+        lines = []
+        snapshot = self.snapshot()
+        for (method, endpoint), stats in sorted(
+            snapshot.items(), key=lambda item: -item[1]['p95']
+        ):
+            lines.append(
+                "{} {}: {} calls, {} errors, {:.1f}kB, "
+                "p50 {} p95 {} p99 {}".format(
+                    method, endpoint,
+                    stats['calls'], stats['errors'],
+                    stats['bytes'] / 1000,
+                    format_seconds(stats['p50']),
+                    format_seconds(stats['p95']),
+                    format_seconds(stats['p99']),
+                )
+            )
+        return lines
@@ -0,0 +1,246 @@
+"""Move the storage price towards a target rank.
+
+A controller gets the current price and the rank delta (target rank
+minus actual rank, positive means we are too cheap) once per cycle
+and returns the next price. Steps are taken in log space, so a step
+means the same relative change at 50SC and at 500SC.
+"""
+from bisect import bisect_left
+from math import exp, log, sqrt
+from time import monotonic
+
+
+class PriceController:
+    """Interface of price controllers, see CONTROLLERS."""
+
+    def __init__(self, deadband: int = 0, max_step: float = 0.5):
+        self.deadband = deadband
+        # Largest relative change per cycle, 0.5 => 50%
+        self.max_log_step = log(1 + max_step)
+
+    def within_deadband(self, delta: int) -> bool:
+        return abs(delta) <= self.deadband
+
+    def clamp(self, log_step: float) -> float:
+        return max(-self.max_log_step, min(self.max_log_step, log_step))
+
+    def next_price(self, price: float, delta: int) -> float:
+        raise NotImplementedError()
+
+    def reset(self):
+        """Forget the history, i.e. after the target changed."""
+
+
+class StepController(PriceController):
+    """The classic fixed step, price * factor ** delta."""
+
+    def __init__(self, factor: float = 1.01, **kwargs):
+        super().__init__(**kwargs)
+        self.factor = factor
+
+    def next_price(self, price: float, delta: int) -> float:
+        if self.within_deadband(delta):
+            return price
+        return price * exp(self.clamp(delta * log(self.factor)))
+
+
+class PIDController(PriceController):
+    """PID in log price space with an adaptive gain.
+
+    The gain is learned from the previous cycle: how many ranks did
+    the last price step move us? Dividing the remaining delta by that
+    sensitivity jumps close to the target in one step, wherever the
+    competitors' prices are dense or sparse. The integral term is
+    reset on overshoot and not accumulated while the step is clamped.
+    """
+    MIN_GAIN = 0.001
+    MAX_GAIN = 100
+    # Aim a little short of the target, rank is not linear in price
+    DAMPING = 0.7
+
+    def __init__(
+        self,
+        kp: float = 0.01,
+        ki: float = 0.0005,
+        kd: float = 0,
+        adaptive: bool = True,
+        **kwargs
+    ):
+        super().__init__(**kwargs)
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.adaptive = adaptive
+        self.reset()
+
+    def reset(self):
+        self.gain = 1
+        self.integral = 0
+        self._last_delta = None
+        self._last_price = None
+
+    def _adapt(self, price: float, delta: int):
+        log_step = log(price / self._last_price)
+        if abs(log_step) < 1e-6:
+            # Price did not change (deadband, minimum price)
+            return
+        # Ranks moved towards the target per log price unit
+        sensitivity = (self._last_delta - delta) / log_step
+        if sensitivity == 0:
+            # Did not pass a single host, step further
+            self.gain *= 2
+        elif sensitivity < 0:
+            # Noise or the market moved, be careful
+            self.gain *= 0.5
+        else:
+            self.gain = self.DAMPING / (self.kp * sensitivity)
+        self.gain = max(self.MIN_GAIN, min(self.MAX_GAIN, self.gain))
+
+    def next_price(self, price: float, delta: int) -> float:
+        if self._last_delta is not None:
+            if self.adaptive:
+                self._adapt(price, delta)
+            if delta * self._last_delta < 0:
+                # Overshot
+                self.integral = 0
+
+        derivative = 0
+        if self._last_delta is not None:
+            derivative = delta - self._last_delta
+        self._last_delta = delta
+        self._last_price = price
+
+        if self.within_deadband(delta):
+            self.integral = 0
+            return price
+
+        integral = self.integral + delta
+        log_step = self.gain * (
+            self.kp * delta + self.ki * integral + self.kd * derivative
+        )
+        clamped = self.clamp(log_step)
+        if clamped == log_step:
+            # Anti windup
+            self.integral = integral
+        return price * exp(clamped)
+
+
+CONTROLLERS = {
+    'pid': PIDController,
+    'step': StepController,
+}
+
+
+def get_controller(config: dict) -> PriceController:
+    """Build the controller configured in the price section."""
+    name = config.get("controller", "pid")
+    if name not in CONTROLLERS:
+        raise ValueError(
+            "Unknown price controller '{}', use one of: {}"
+            .format(name, ", ".join(CONTROLLERS))
+        )
+    kwargs = {
+        'deadband': int(config.get("deadband", 1)),
+        'max_step': float(config.get("max-step", 0.5)),
+    }
+    if name == 'pid':
+        kwargs['kp'] = float(config.get("kp", 0.01))
+        kwargs['ki'] = float(config.get("ki", 0.0005))
+        kwargs['kd'] = float(config.get("kd", 0))
+        kwargs['adaptive'] = bool(config.get("adaptive", True))
+    else:
+        kwargs['factor'] = float(config.get("factor", 1.01))
+    return CONTROLLERS[name](**kwargs)
+
+
+class RankModel:
+    """Our hostdb rank as a function of our price.
+
+    siad orders hosts by a score, price is one of its factors. The
+    model keeps the competitors' scores fixed and orders them by
+    price. Everything else, i.e. cheaper hosts we beat by uptime,
+    is an offset calibrated with the rank we have at our price.
+    """
+
+    def __init__(self, competitor_prices: list, price: float, rank: int):
+        self.prices = sorted(competitor_prices)
+        self.offset = rank - 1 - bisect_left(self.prices, price)
+
+    def rank(self, price: float) -> int:
+        return 1 + self.offset + bisect_left(self.prices, price)
+
+    def _lowest_price_ranking(self, rank: int, low: float, high: float) -> float:
+        """Binary search the lowest price with self.rank() >= rank."""
+        if self.rank(low) >= rank:
+            return low
+        if self.rank(high) < rank:
+            return high
+        # Until the bounds are 0.01% apart, in log space
+        while high / low > 1.0001:
+            middle = sqrt(low * high)
+            if self.rank(middle) >= rank:
+                high = middle
+            else:
+                low = middle
+        return high
+
+    def solve(self, target: int, low: float, high: float) -> float:
+        """Price between low and high which ranks target.
+
+        The middle of the price range of the target rank, so small
+        moves of the competitors do not change our rank.
+        """
+        return sqrt(
+            self._lowest_price_ranking(target, low, high)
+            * self._lowest_price_ranking(target + 1, low, high)
+        )
+
+
+class ConvergenceTracker:
+    """Cycles, time and overshoot of approaching the target rank.
+
+    An approach starts when the delta leaves the deadband and ends
+    when it is back inside.
+    """
+
+    def __init__(self, deadband: int = 0):
+        self.deadband = deadband
+        self.converged = False
+        self._start = None
+        self._cycles = 0
+        self._direction = 0
+        self.overshoot = 0
+
+    def update(self, delta: int) -> str:
+        """Record a cycle, returns a line to log."""
+        if abs(delta) <= self.deadband:
+            if self.converged:
+                return "On target, {} ranks off".format(delta)
+            self.converged = True
+            if self._start is None:
+                return "On target"
+            self.overshoot = max(self.overshoot, -self._direction * delta)
+            message = (
+                "Reached target after {} cycles in {:.0f}s, overshoot {} ranks"
+                .format(
+                    self._cycles, monotonic() - self._start, self.overshoot
+                )
+            )
+            self._start = None
+            return message
+
+        if self._start is None:
+            self.converged = False
+            self._start = monotonic()
+            self._cycles = 0
+            self._direction = 1 if delta > 0 else -1
+            self.overshoot = 0
+        self._cycles += 1
+        # Past the target means the opposite sign of the first delta
+        self.overshoot = max(self.overshoot, -self._direction * delta)
+        return (
+            "Approaching target, cycle {}, {:.0f}s, {} ranks off, overshoot {} ranks"
+            .format(
+                self._cycles, monotonic() - self._start, delta, self.overshoot
+            )
+        )
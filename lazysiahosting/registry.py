@@ -0,0 +1,145 @@
+"""Modules by config section, imported only once enabled.
+
+Besides the built in modules, other packages can ship modules
+through the entry point group "lazysiahosting.modules":
+the entry point name is the config section, its value the class.
+"""
+import sys
+from importlib import import_module
+from importlib.metadata import entry_points
+from threading import Lock
+from time import perf_counter
+
+ENTRY_POINT_GROUP = "lazysiahosting.modules"
+
+
+class ModuleSpec:
+    """Where to find the module of a config section."""
+
+    def __init__(
+        self,
+        section: str,
+        module_path: str,
+        class_name: str,
+    ):
+        self.section = section
+        self.module_path = module_path
+        self.class_name = class_name
+        # Filled by load()
+        self.import_seconds = None
+        self.imported_modules = 0
+
+    def load(self) -> type:
+        """Import and return the module class, timing the first import."""
+        before = len(sys.modules)
+        start = perf_counter()
+        python_module = import_module(self.module_path, __package__)
+        if self.import_seconds is None:
+            self.import_seconds = perf_counter() - start
+            self.imported_modules = len(sys.modules) - before
+        auto_module = getattr(python_module, self.class_name)
+
+        declared_section = getattr(auto_module, "config_section", None)
+        if declared_section and declared_section != self.section:
+            raise ValueError(
+                "{} declares config section '{}' but is registered as '{}'."
+                .format(self.class_name, declared_section, self.section)
+            )
+        return auto_module
+
+
+BUILTIN_MODULES = (
+    ModuleSpec("unlock", ".autounlock", "AutoUnlock"),
+    ModuleSpec("price", ".autoprice", "AutoPrice"),
+    ModuleSpec("restart", ".autorestart", "AutoRestart"),
+    ModuleSpec("throttle", ".autothrottle", "AutoThrottle"),
+    ModuleSpec("payout", ".autopayout", "AutoPayout"),
+)
+
+_registered = []
+
+
+def register_module(spec: ModuleSpec):
+    """Register a module from code, i.e. in a wrapper script."""
+    _registered.append(spec)
+
+
+def _entry_points(group: str) -> list:
+    try:
+        return list(entry_points(group=group))
+    except TypeError:
+        # Python < 3.10
+        return list(entry_points().get(group, []))
+
+
+def discover_modules() -> tuple:
+    """Built in, registered and entry point modules, none imported yet."""
+    specs = list(BUILTIN_MODULES) + list(_registered)
+    for entry_point in _entry_points(ENTRY_POINT_GROUP):
+        specs.append(ModuleSpec(
+            entry_point.name, entry_point.module, entry_point.attr
+        ))
+
+    unique = []
+    sections = set()
+    for spec in specs:
+        if spec.section in sections:
+            print(
+                "Ignoring {} for config section '{}', already taken."
+                .format(spec.class_name, spec.section)
+            )
+            continue
+        sections.add(spec.section)
+        unique.append(spec)
+    return tuple(unique)
+
+
+class LazyService:
+    """A service built on first use, i.e. one which imports aiohttp."""
+
+    def __init__(self, factory):
+        self.factory = factory
+        self._service = None
+        self._lock = Lock()
+
+    @property
+    def built(self) -> bool:
+        return self._service is not None
+
+    def get(self):
+        with self._lock:
+            if self._service is None:
+                self._service = self.factory()
+            return self._service
+
+
+def resolve_requirements(auto_module: type, services: dict) -> list:
+    """Constructor arguments after the config, by auto_module.requires."""
+    args = []
+    for name in getattr(auto_module, "requires", ()):
+        if name not in services:
+            raise ValueError(
+                "{} requires '{}', which this process does not provide."
+                .format(auto_module.__name__, name)
+            )
+        service = services[name]
+        if isinstance(service, LazyService):
+            service = service.get()
+        args.append(service)
+    return args
+
+
+def import_report(specs) -> list:
+    """One line per loaded module, like python -X importtime."""
+    lines = []
+    for spec in specs:
+        if spec.import_seconds is None:
+            continue
+        lines.append(
+            "{}: {:.1f}ms, {} new python modules".format(
+                spec.class_name,
+                spec.import_seconds * 1000,
+                spec.imported_modules,
+            )
+        )
+    return lines
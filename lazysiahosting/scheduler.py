@@ -0,0 +1,259 @@
+"""Run modules as periodic tasks on a small, bounded worker pool."""
+import heapq
+from itertools import count
+from queue import Queue
+from threading import Condition, Thread, get_ident
+from time import monotonic
+from .automodule import AutoModule
+
+
+class Task:
+    def __init__(self, module: AutoModule):
+        self.module = module
+        self.ticks = 0
+        self.late_ticks = 0
+        # Heap entries of older versions are stale and skipped
+        self.version = 0
+        self.running = False
+        self.wake_pending = False
+        self.disabled = False
+        # For the watchdog, see module.heartbeat(). None while the
+        # tick is queued and not started by a worker yet.
+        self.heartbeat = None
+        self.thread_id = None
+        self.stuck = False
+        # Add the module again once the abandoned tick returned
+        self.restart = False
+        # Called once the tick in flight of a removed task returned
+        self.on_removed = None
+
+    def touch(self):
+        self.heartbeat = monotonic()
+
+    @property
+    def deadline(self) -> float:
+        return self.module.deadline or self.module.interval
+
+
+class Scheduler:
+    """Timer heap, replaces one sleeping thread per module.
+
+    One thread owns the heap and hands due ticks to at most
+    `workers` threads, however many modules are added. A module
+    never has more than one tick in flight. module.wake() moves
+    its next tick to now.
+
+    Workers are daemon threads: after stop(), run() waits at most
+    `grace` seconds for ticks in flight and then returns anyway.
+    """
+
+    def __init__(self, workers: int = 4, grace: float = 0.5):
+        self.workers = workers
+        self.grace = grace
+        self._heap = []
+        self._sequence = count()
+        self._condition = Condition()
+        self._stopped = False
+        self._queue = Queue()
+        self._tasks = {}
+        # module => task of an abandoned tick still running
+        self._abandoned = {}
+        self._threads = []
+
+    def add(self, module: AutoModule, delay: float = 0):
+        module.print("Start module")
+        task = Task(module)
+        module._wake = lambda: self.wake(task)
+        with self._condition:
+            self._tasks[module] = task
+            self._push(task, monotonic() + delay)
+
+    def remove(self, module: AutoModule, then=None):
+        """Stop scheduling module, a tick in flight still finishes.
+
+        then() is called once no tick of module is in flight anymore.
+        """
+        with self._condition:
+            task = self._tasks.pop(module, None)
+            if task is not None:
+                task.disabled = True
+                # Invalidates the heap entry
+                task.version += 1
+            else:
+                task = self._abandoned.get(module)
+                if task is not None:
+                    task.restart = False
+            in_flight = task is not None and task.running
+            if in_flight:
+                task.on_removed = then
+        module._wake = None
+        if then and not in_flight:
+            then()
+
+    def running_tasks(self) -> list:
+        """Tasks with a tick started by a worker, not only queued."""
+        with self._condition:
+            return [
+                task for task in self._tasks.values()
+                if task.running and task.heartbeat is not None
+            ]
+
+    def abandon(self, task: Task, restart: bool = True):
+        """Give up on the stuck tick of task.
+
+        A thread can not be killed, so a new worker takes the place
+        of the stuck one, which exits once its tick returns. If
+        restart, the module starts over with a fresh task right
+        after that, never with two ticks in flight.
+        """
+        module = task.module
+        with self._condition:
+            if self._tasks.get(module) is not task:
+                return
+            task.stuck = True
+            task.disabled = True
+            task.restart = restart
+            task.version += 1
+            del self._tasks[module]
+            self._abandoned[module] = task
+            self._start_worker()
+        module._wake = None
+
+    def _push(self, task: Task, due: float):
+        with self._condition:
+            task.version += 1
+            heapq.heappush(
+                self._heap, (due, next(self._sequence), task.version, task)
+            )
+            self._condition.notify()
+
+    def wake(self, task: Task):
+        """Tick now, or right after the tick in flight."""
+        with self._condition:
+            if self._stopped or task.disabled:
+                return
+            if task.running:
+                task.wake_pending = True
+            else:
+                self._push(task, monotonic())
+
+    def _tick(self, task: Task, due: float) -> bool:
+        """Returns True if the worker has been replaced and has to exit."""
+        module = task.module
+        if task.disabled:
+            # Removed while queued
+            with self._condition:
+                task.running = False
+            self._tick_returned(task)
+            return False
+        start = monotonic()
+        task.thread_id = get_ident()
+        task.touch()
+        module._heartbeat = task.touch
+        failed = False
+        try:
+            delay = module.tick()
+            module.record_success()
+        except Exception:
+            failed = True
+            delay = module.record_failure()
+        finally:
+            task.ticks += 1
+
+        duration = monotonic() - start
+        if task.stuck:
+            module.print(
+                "Abandoned tick returned after {:.1f}s".format(duration)
+            )
+            with self._condition:
+                self._abandoned.pop(module, None)
+                task.running = False
+                restart = task.restart and not self._stopped
+            self._tick_returned(task)
+            if restart:
+                self.add(module)
+            return True
+        if start - due + duration > task.deadline:
+            task.late_ticks += 1
+            module.print(
+                "Tick missed its deadline of {:.1f}s "
+                "(started {:.1f}s late, took {:.1f}s)"
+                .format(task.deadline, start - due, duration)
+            )
+
+        if failed and delay is None:
+            with self._condition:
+                task.running = False
+                task.disabled = True
+            self._tick_returned(task)
+            return False
+        if delay is None:
+            delay = module.next_interval()
+        with self._condition:
+            task.running = False
+            if task.wake_pending:
+                task.wake_pending = False
+                delay = 0
+            if not self._stopped and not task.disabled:
+                self._push(task, monotonic() + delay)
+        self._tick_returned(task)
+        return False
+
+    def _tick_returned(self, task: Task):
+        with self._condition:
+            callback = task.on_removed
+            task.on_removed = None
+        if callback:
+            callback()
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            if self._tick(*job):
+                return
+
+    def _start_worker(self):
+        thread = Thread(
+            target=self._work,
+            name="module-{}".format(len(self._threads)),
+            daemon=True,
+        )
+        self._threads.append(thread)
+        thread.start()
+
+    def run(self):
+        """Run until stop() is called."""
+        for _ in range(self.workers):
+            self._start_worker()
+
+        with self._condition:
+            while not self._stopped:
+                if not self._heap:
+                    self._condition.wait()
+                    continue
+                due = self._heap[0][0]
+                now = monotonic()
+                if due > now:
+                    self._condition.wait(due - now)
+                    continue
+                _, _, version, task = heapq.heappop(self._heap)
+                if version != task.version:
+                    continue
+                task.running = True
+                # Not started until a worker picks the tick up
+                task.heartbeat = None
+                self._queue.put((task, due))
+
+        threads = [thread for thread in self._threads if thread.is_alive()]
+        for thread in threads:
+            self._queue.put(None)
+        give_up = monotonic() + self.grace
+        for thread in threads:
+            thread.join(max(0, give_up - monotonic()))
+
+    def stop(self):
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
@@ -0,0 +1,46 @@
+"""Process wide shutdown, every wait of the modules respects it."""
+import signal
+from threading import Event, Lock
+
+event = Event()
+
+_callbacks = []
+_lock = Lock()
+
+
+def is_set() -> bool:
+    return event.is_set()
+
+
+def wait(seconds: float) -> bool:
+    """Sleep for seconds, return True early if shutting down."""
+    return event.wait(seconds)
+
+
+def on_shutdown(callback):
+    """Call callback() once shutdown is requested."""
+    with _lock:
+        _callbacks.append(callback)
+        already_set = event.is_set()
+    if already_set:
+        callback()
+
+
+def request_shutdown():
+    with _lock:
+        if event.is_set():
+            return
+        event.set()
+        callbacks = list(_callbacks)
+    for callback in callbacks:
+        callback()
+
+
+def install_signal_handlers():
+    """Shut down on SIGTERM (systemd stop) and SIGINT (Ctrl-C)."""
+    def handler(signum, frame):
+        print("Received {}, shutting down".format(signal.Signals(signum).name))
+        request_shutdown()
+
+    signal.signal(signal.SIGTERM, handler)
+    signal.signal(signal.SIGINT, handler)
@@ -1,13 +1,46 @@
-from requests import (
-    get,
-    post,
-)
+from requests import Session
+from requests.adapters import HTTPAdapter
 from requests.auth import HTTPBasicAuth
+from requests.exceptions import (
+    ChunkedEncodingError, ConnectionError, ReadTimeout, Timeout
+)
+from contextlib import contextmanager
 from enum import Enum
+from threading import Lock, local
+from time import monotonic, sleep, time
+from .apischeduler import BULK, CRITICAL, NORMAL, ApiScheduler
+from .circuitbreaker import CircuitBreaker, CircuitOpenError, backoff_delay
+from .hostdb import HostDBIndex, format_pubkey, iter_hosts
+from .metrics import RequestMetrics
+from .singleflight import SingleFlight
 
 TERRABYTE_BYTES = 1e12
 BLOCKS_PER_MONTH = 4320
 
+HOSTDB_CHUNK_SIZE = 64 * 1024
+
+# Errors meaning siad did not answer, as opposed to an error response
+TRANSPORT_ERRORS = (ConnectionError, Timeout, ChunkedEncodingError)
+
+# Calls not wrapped in Siad.priority()
+ENDPOINT_PRIORITY = {
+    ('GET', '/hostdb/active'): BULK,
+    ('POST', '/wallet/unlock'): CRITICAL,
+}
+
+# Calls which may take longer than the read timeout, siad keeps
+# working on them, so their read timeout does not mean siad is down
+SLOW_ENDPOINTS = {
+    ('POST', '/wallet/unlock'),
+}
+
+# Seconds a snapshot of a GET endpoint is shared between modules
+DEFAULT_CACHE_TTL = {
+    '/host': 2,
+    '/wallet': 2,
+    '/consensus': 10,
+}
+
 class Result(Enum):
     SUCCESS = False
     FAILURE = True
@@ -26,6 +59,13 @@ def tiny_price_to_big_price(hastings: str) -> float:
         int(hastings) * TERRABYTE_BYTES * BLOCKS_PER_MONTH
     )
 
+def host_setting_to_str(value) -> str:
+    """Format a value the way siad reports host settings."""
+    if isinstance(value, bool):
+        return str(value).lower()
+    return str(value)
+
+
 def big_price_to_tiny_price(siacoins: float) -> int:
     """SC per TB per month to hastings per byte per block."""
     return round(
@@ -35,15 +75,75 @@ def big_price_to_tiny_price(siacoins: float) -> int:
 
 
 class Siad:
-    """Communicate with the service siad."""
+    """Communicate with the service siad.
+
+    One instance is shared by all module threads. It owns a pooled
+    keep-alive session, which is only configured here and never
+    mutated afterwards, so concurrent requests are safe.
+    """
 
     def __init__(
         self,
         host: str,
         api_password: str,
+        pool_size: int = 10,
+        connect_timeout: float = 3.05,
+        read_timeout: float = 30,
+        unlock_timeout: float = None,
+        keep_alive: bool = True,
+        cache_ttl: dict = None,
+        metrics_interval: float = 0,
+        retries: int = 2,
+        retry_backoff: float = 0.5,
+        retry_backoff_max: float = 10,
+        breaker: CircuitBreaker = None,
+        api_scheduler: ApiScheduler = None,
     ):
         self.host = host
         self.api_password = api_password
+        self.timeout = (connect_timeout, read_timeout)
+        # Unlocking big wallets takes minutes, None = wait for siad
+        self.unlock_timeout = (connect_timeout, unlock_timeout)
+        # Only idempotent GETs are retried
+        self.retries = retries
+        self.retry_backoff = retry_backoff
+        self.retry_backoff_max = retry_backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self.api_scheduler = api_scheduler or ApiScheduler()
+        self._priority = local()
+
+        self.session = Session()
+        self.session.auth = HTTPBasicAuth('', api_password)
+        self.session.headers['User-Agent'] = 'Sia-Agent'
+        if not keep_alive:
+            self.session.headers['Connection'] = 'close'
+        # Block instead of opening throwaway connections
+        # when more threads than pool_size want to talk to siad.
+        adapter = HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=pool_size,
+            pool_block=True,
+        )
+        self.session.mount('http://', adapter)
+
+        self.cache_ttl = dict(DEFAULT_CACHE_TTL, **(cache_ttl or {}))
+        # uri => (timestamp, document)
+        self._snapshots = {}
+        # Bumped on every invalidation, so a fetch started before
+        # a write does not store its outdated result.
+        self._snapshot_generation = 0
+        self._snapshot_lock = Lock()
+        self.single_flight = SingleFlight()
+        self.hostdb = HostDBIndex()
+
+        self.metrics = RequestMetrics()
+        # Print a metrics summary every metrics_interval seconds, 0 = never
+        self.metrics_interval = metrics_interval
+        self._metrics_printed = monotonic()
+
+        # Depth of batch_host() and the host settings staged inside,
+        # per thread, written in one POST
+        self._batch = local()
 
     @property
     def public_hostname(self) -> str:
@@ -79,80 +179,279 @@ class Siad:
 
     @property
     def pubkey(self) -> str:
-        host = self.get_host()
-        pubkey = "{}:{}".format(
-            host["publickey"]["algorithm"],
-            host["publickey"]["key"],
-        )
+        return format_pubkey(self.get_host()["publickey"])
 
     @property
     def balance(self) -> float:
         wallet = self.get_wallet()
         return hastings_to_siacoin(wallet["confirmedsiacoinbalance"])
 
-    def request(self, method, uri, headers: dict = {}, **kwargs):
-        headers['User-Agent'] = 'Sia-Agent'
-        auth = HTTPBasicAuth('', self.api_password)
+    @contextmanager
+    def priority(self, priority: int):
+        """Run the siad calls of this thread with priority.
+
+        i.e. `with siad.priority(CRITICAL): siad.get_host(fresh=True)`
+        """
+        previous = getattr(self._priority, 'value', None)
+        self._priority.value = priority
+        try:
+            yield
+        finally:
+            self._priority.value = previous
+
+    def priority_of(self, method: str, uri: str) -> int:
+        priority = getattr(self._priority, 'value', None)
+        if priority is not None:
+            return priority
+        return ENDPOINT_PRIORITY.get((method, uri.split('?', 1)[0]), NORMAL)
+
+    def request(self, method: str, uri, headers: dict = None, **kwargs):
+        """Call siad, retrying GETs with jittered exponential backoff.
+
+        Raises CircuitOpenError without calling siad while it is
+        considered down. Waits for the api scheduler first.
+        """
+        retries = self.retries if method == 'GET' else 0
+        attempt = 0
+        while True:
+            try:
+                with self.api_scheduler.slot(self.priority_of(method, uri)):
+                    return self._request_once(method, uri, headers, **kwargs)
+            except CircuitOpenError:
+                raise
+            except TRANSPORT_ERRORS:
+                if attempt >= retries:
+                    raise
+            sleep(backoff_delay(
+                attempt, self.retry_backoff, self.retry_backoff_max
+            ))
+            attempt += 1
+
+    def _request_once(self, method: str, uri, headers: dict = None, **kwargs):
         url = 'http://' + self.host + uri
-        return method(url, headers=headers, auth=auth, **kwargs)
+        kwargs.setdefault('timeout', self.timeout)
+        self.breaker.before_call()
+        start = monotonic()
+        try:
+            res = self.session.request(method, url, headers=headers, **kwargs)
+        except Exception as e:
+            slow = (method, uri.split('?', 1)[0]) in SLOW_ENDPOINTS
+            if isinstance(e, ReadTimeout) and slow:
+                # Connected, siad is alive and still working on it
+                self.breaker.record_success()
+            elif isinstance(e, TRANSPORT_ERRORS):
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            self.metrics.record(method, uri, monotonic() - start, error=True)
+            raise
+        self.breaker.record_success()
+        # Streamed bodies are accounted while they are read
+        bytes_received = 0 if kwargs.get('stream') else len(res.content)
+        self.metrics.record(
+            method, uri, monotonic() - start,
+            bytes_received=bytes_received,
+            error=res.status_code >= 400,
+        )
+        self.print_metrics_if_due()
+        return res
+
+    def print_metrics_if_due(self):
+        if not self.metrics_interval:
+            return
+        now = monotonic()
+        if now - self._metrics_printed < self.metrics_interval:
+            return
+        self._metrics_printed = now
+        for line in self.metrics.summary():
+            print("[Siad] {}".format(line))
+
+    def invalidate(self, uri: str = None):
+        """Drop the cached snapshot of uri, or all snapshots."""
+        with self._snapshot_lock:
+            self._snapshot_generation += 1
+            if uri is None:
+                self._snapshots.clear()
+            else:
+                self._snapshots.pop(uri, None)
+
+    def get_snapshot(self, uri: str, fresh: bool = False) -> dict:
+        """GET uri as json, shared for cache_ttl[uri] seconds.
+
+        The returned document is shared, do not modify it.
+        Raises HTTPError on an error response of siad.
+        """
+        ttl = self.cache_ttl.get(uri, 0)
+        with self._snapshot_lock:
+            generation = self._snapshot_generation
+            cached = self._snapshots.get(uri)
+        if not fresh and cached and monotonic() - cached[0] < ttl:
+            return cached[1]
+
+        def fetch():
+            res = self.request('GET', uri)
+            # Never cache and share an error document
+            res.raise_for_status()
+            return res.json()
+
+        timestamp = monotonic()
+        # Keyed by generation, so nobody joins a read started before a write
+        document = self.single_flight.do((uri, generation), fetch)
+        with self._snapshot_lock:
+            if ttl > 0 and generation == self._snapshot_generation:
+                self._snapshots[uri] = (timestamp, document)
+        return document
+
+    @contextmanager
+    def batch_host(self):
+        """Stage all set_host calls and write them in one POST at exit.
+
+        Siad persists its settings on every /host POST, so
+        a pricing tick should change all its settings at once.
+        If the outermost batch raises, its settings are dropped.
+        """
+        depth = getattr(self._batch, 'depth', 0)
+        self._batch.depth = depth + 1
+        try:
+            yield
+        except BaseException:
+            if depth == 0:
+                self._batch.pending = {}
+            raise
+        finally:
+            self._batch.depth = depth
+        if depth == 0:
+            self.flush_host()
+
+    def flush_host(self):
+        """Write the host settings staged by this thread."""
+        settings = getattr(self._batch, 'pending', None)
+        self._batch.pending = {}
+        if settings:
+            return self.set_host_many(settings)
+
+    def set_host_many(self, settings: dict):
+        """Write host settings with a single POST.
+
+        Keys whose value equals the (cached) current setting are skipped.
+        Returns None if nothing had to be written.
+        """
+        current = self.get_host()['internalsettings']
+        changed = {
+            key: host_setting_to_str(value)
+            for key, value in settings.items()
+            if key not in current
+            or host_setting_to_str(current[key]) != host_setting_to_str(value)
+        }
+        if not changed:
+            return None
+        try:
+            return self.request('POST', '/host', params=changed)
+        finally:
+            self.invalidate('/host')
 
     def set_host(self, key, value):
-        return self.request(
-            post, '/host?{}={}'.format(key, value)
-        )
+        """Write a host setting, or stage it inside batch_host()."""
+        if getattr(self._batch, 'depth', 0):
+            if not hasattr(self._batch, 'pending'):
+                self._batch.pending = {}
+            self._batch.pending[key] = value
+            return None
+        return self.set_host_many({key: value})
 
-    def get_host(self) -> dict:
-        res = self.request(
-            get, '/host'
-        )
-        return res.json()
+    def get_host(self, fresh: bool = False) -> dict:
+        return self.get_snapshot('/host', fresh)
 
-    def get_wallet(self) -> dict:
-        res = self.request(
-            get, '/wallet'
-        )
-        return res.json()
+    def get_wallet(self, fresh: bool = False) -> dict:
+        return self.get_snapshot('/wallet', fresh)
 
-    def get_consensus(self) -> dict:
-        res = self.request(
-            get, '/consensus'
-        )
-        return res.json()
+    def get_consensus(self, fresh: bool = False) -> dict:
+        return self.get_snapshot('/consensus', fresh)
 
     def unlock_wallet(self, walletpassword: str) -> Result:
         res = self.request(
-            post, '/wallet/unlock',
+            'POST', '/wallet/unlock',
             params={'encryptionpassword': walletpassword},
+            timeout=self.unlock_timeout,
         )
+        self.invalidate('/wallet')
         if not res.text:
             return Result.SUCCESS
         if "wallet has already been unlocked" in res.text:
             return Result.SUCCESS
         return Result.FAILURE
 
-    def get_hostdb_rank_and_price(self):
-        res = self.request(
-            get, '/hostdb/active'
-        ).json()
+    def iter_hostdb(self, fields: tuple = None):
+        """Stream the active hosts, keeping only fields of each.
+
+        Break out of the loop to stop downloading early.
+        """
+        # Hold the slot while the body is downloaded, too
+        with self.api_scheduler.slot(self.priority_of('GET', '/hostdb/active')):
+            res = self.request('GET', '/hostdb/active', stream=True)
+            bytes_received = 0
+
+            def chunks():
+                nonlocal bytes_received
+                for chunk in res.iter_content(HOSTDB_CHUNK_SIZE):
+                    bytes_received += len(chunk)
+                    yield chunk
+
+            try:
+                yield from iter_hosts(chunks(), fields)
+            finally:
+                res.close()
+                self.metrics.add_bytes('GET', '/hostdb/active', bytes_received)
+
+    def refresh_hostdb(self) -> HostDBIndex:
+        """Download the hostdb into self.hostdb."""
+        def refresh():
+            timestamp = time()
+            self.hostdb.refresh(self.iter_hostdb(HostDBIndex.FIELDS), timestamp)
+        self.single_flight.do('refresh-hostdb', refresh)
+        return self.hostdb
+
+    def _own_hostdb_entry(self, refresh: bool):
+        if refresh:
+            self.refresh_hostdb()
 
-        self_public_address = self.public_hostname
-        for i in range(len(res["hosts"])):
-            if res["hosts"][i]["netaddress"] == self_public_address:
-                # Reversed, #1 is best (#0 does not exist)
-                index = len(res["hosts"]) - i
-                price = tiny_price_to_big_price(res["hosts"][i]["storageprice"])
-                return (index, price)
+        host = self.get_host()
+        return self.hostdb.lookup(
+            netaddress=host['externalsettings']['netaddress'],
+            pubkey=format_pubkey(host['publickey']),
+        )
 
-        return None
+    def get_hostdb_rank_and_price(self, refresh: bool = True):
+        entry = self._own_hostdb_entry(refresh)
+        if entry is None:
+            return None
+        return (entry.rank, tiny_price_to_big_price(entry.storageprice))
+
+    def get_hostdb_market(self, refresh: bool = True):
+        """Our rank, our price and the prices of all other hosts.
+
+        Prices in SC/TB/month, as the hostdb has seen them.
+        None if we are not in the hostdb.
+        """
+        entry = self._own_hostdb_entry(refresh)
+        if entry is None:
+            return None
+        prices = [
+            tiny_price_to_big_price(other.storageprice)
+            for other in self.hostdb.entries()
+            if other is not entry and other.storageprice is not None
+        ]
+        return (entry.rank, tiny_price_to_big_price(entry.storageprice), prices)
 
     def send_siacoins(self, amount_in_siacoins_not_hastings: float, address: str):
         res = self.request(
-            post, "/wallet/siacoins",
+            'POST', "/wallet/siacoins",
             data={
                 "amount": siacoin_to_hastings(amount_in_siacoins_not_hastings),
                 "destination": address,
             }
         )
+        self.invalidate('/wallet')
         return res.json()
 
 
@@ -1,18 +1,76 @@
-from requests import (
-    get,
-    post,
-)
+import json
+import os
+from threading import Lock
+from time import monotonic
+from requests import Session
+from requests.exceptions import HTTPError
 from .siad import Siad
 
+SIASTATS_URL = 'https://siastats.info:3510'
+
 
 class Siastats:
-    def __init__(self, siad: Siad):
+    """Long lived siastats.info client.
+
+    The host id is looked up once and kept in cache_path. The list
+    of all hosts is large, it is indexed by ip and public key and
+    reused for hosts_ttl seconds. Our host document is fetched at
+    most once per host_ttl seconds, i.e. once per AutoPrice cycle.
+    """
+
+    def __init__(
+        self,
+        siad: Siad,
+        cache_path: str = "siastats-host.json",
+        hosts_ttl: float = 3600,
+        host_ttl: float = 60,
+        timeout: float = 30,
+    ):
         self.siad = siad
-        self.host_id = self.get_host_id(self.siad.public_hostname)
+        self.cache_path = cache_path
+        self.hosts_ttl = hosts_ttl
+        self.host_ttl = host_ttl
+        self.timeout = timeout
+        self.session = Session()
+        self._lock = Lock()
+
+        self._host_ids = self._load()
+        self._by_ip = {}
+        self._by_pubkey = {}
+        self._hosts_fetched = None
+        self._host = None
+        self._host_fetched = None
+
+    @property
+    def host_id(self) -> int:
+        hostname = self.siad.public_hostname
+        host_id = self._host_ids.get(hostname)
+        if host_id is None:
+            host_id = self.get_host_id(hostname)
+            if host_id is not None:
+                self._host_ids[hostname] = host_id
+                self._save()
+        return host_id
 
     @property
     def host(self) -> dict:
-        return self.get_host(self.host_id)
+        with self._lock:
+            if (
+                self._host is None
+                or monotonic() - self._host_fetched > self.host_ttl
+            ):
+                host_id = self.host_id
+                if host_id is None:
+                    raise LookupError("Host not found on siastats")
+                try:
+                    self._host = self.get_host(host_id)
+                except HTTPError as e:
+                    if e.response.status_code == 404:
+                        # Cached id is gone
+                        self.forget_host_id()
+                    raise
+                self._host_fetched = monotonic()
+            return self._host
 
     @property
     def rank(self) -> int:
@@ -30,24 +88,93 @@ class Siastats:
     def storage_price_uptodate(self) -> bool:
         return abs(self.storage_price - self.siad.storage_price) < 0.1
 
-    def request(self, method, uri, headers: dict = {}, **kwargs):
-        url = 'https://siastats.info:3510' + uri
-        return method(url, headers=headers, **kwargs)
+    def _load(self) -> dict:
+        """hostname => siastats id"""
+        if not self.cache_path:
+            return {}
+        try:
+            with open(self.cache_path) as f:
+                return {
+                    hostname: int(host_id)
+                    for hostname, host_id in json.load(f).items()
+                }
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError, AttributeError, TypeError) as e:
+            print("Ignoring siastats cache {}: {}".format(self.cache_path, e))
+            return {}
+
+    def _save(self):
+        if not self.cache_path:
+            return
+        temporary = self.cache_path + ".tmp"
+        try:
+            with open(temporary, "w") as f:
+                json.dump(self._host_ids, f)
+            os.replace(temporary, self.cache_path)
+        except OSError as e:
+            print("Could not write siastats cache {}: {}".format(
+                self.cache_path, e
+            ))
+
+    def forget_host_id(self):
+        """Look the host id up again, i.e. after siastats dropped it."""
+        self._host_ids.pop(self.siad.public_hostname, None)
+        self._save()
+
+    def request(self, method: str, uri, headers: dict = None, **kwargs):
+        url = SIASTATS_URL + uri
+        kwargs.setdefault('timeout', self.timeout)
+        res = self.session.request(method, url, headers=headers, **kwargs)
+        res.raise_for_status()
+        return res
 
     def get_all_hosts(self) -> dict:
         return self.request(
-            post, '/hosts-api/allhosts',
+            'POST', '/hosts-api/allhosts',
             data={'network': 'sia', 'list': 'active'}
         ).json()
 
+    def refresh_hosts(self, force: bool = False):
+        """Index all hosts, unless the index is younger than hosts_ttl."""
+        if (
+            not force
+            and self._hosts_fetched is not None
+            and monotonic() - self._hosts_fetched < self.hosts_ttl
+        ):
+            return
+        by_ip = {}
+        by_pubkey = {}
+        for host in self.get_all_hosts():
+            by_ip[host.get('CurrentIp')] = host
+            if host.get('Pubkey'):
+                by_pubkey[host['Pubkey']] = host
+        self._by_ip = by_ip
+        self._by_pubkey = by_pubkey
+        self._hosts_fetched = monotonic()
+
+    def lookup(self, host_name: str = None, pubkey: str = None) -> dict:
+        """Find a host of the all hosts list by public key or ip."""
+        self.refresh_hosts()
+        host = None
+        if pubkey:
+            host = self._by_pubkey.get(pubkey)
+        if host is None and host_name:
+            host = self._by_ip.get(host_name)
+        return host
+
     def get_host_id(self, host_name: str) -> int:
-        host_list = self.get_all_hosts()
-        for host in host_list:
-            if host['CurrentIp'] == host_name:
-                return host['Id']
-        return None
+        fetched = self._hosts_fetched
+        host = self.lookup(host_name=host_name, pubkey=self.siad.pubkey)
+        if host is None and fetched == self._hosts_fetched:
+            # An older list, we might be newer than it
+            self.refresh_hosts(force=True)
+            host = self.lookup(host_name=host_name, pubkey=self.siad.pubkey)
+        if host is None:
+            return None
+        return host['Id']
 
     def get_host(self, host_id: int):
         return self.request(
-            get, '/hosts-api/host/{}'.format(host_id)
+            'GET', '/hosts-api/host/{}'.format(host_id)
         ).json()
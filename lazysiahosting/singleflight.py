@@ -0,0 +1,59 @@
+from threading import Event, Lock
+
+
+class _Call:
+    def __init__(self):
+        self.done = Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key.
+
+    While a call for a key is in flight, other threads asking for the
+    same key wait for it and get the same result (or exception)
+    instead of starting their own call.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self._in_flight = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    @property
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'coalesced': self.coalesced,
+            }
+
+    def do(self, key, function):
+        with self._lock:
+            call = self._in_flight.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._in_flight[key] = call
+                self.calls += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = function()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            call.done.set()
+        return call.result
@@ -0,0 +1,65 @@
+"""Notice modules hanging in a tick and dump their stack."""
+import sys
+import traceback
+from threading import Thread
+from time import monotonic
+from . import shutdown
+from .scheduler import Scheduler
+
+
+class Watchdog:
+    """Check the heartbeat of every running tick.
+
+    A tick silent for more than `factor` times its deadline is
+    considered stuck: its stack is printed, then the module
+    decides via on_stuck() if it is restarted or disabled.
+    """
+
+    def __init__(self, scheduler: Scheduler, factor: float = 2, check_interval: float = 5):
+        self.scheduler = scheduler
+        self.factor = factor
+        self.check_interval = check_interval
+        self.stuck_ticks = 0
+        self.thread = Thread(target=self.watch, name="watchdog", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def watch(self):
+        while not shutdown.wait(self.check_interval):
+            self.check()
+
+    def check(self):
+        now = monotonic()
+        for task in self.scheduler.running_tasks():
+            heartbeat = task.heartbeat
+            if heartbeat is None:
+                # Queued again since running_tasks()
+                continue
+            silent = now - heartbeat
+            if task.stuck or silent <= task.deadline * self.factor:
+                continue
+            self.stuck_ticks += 1
+            self.dump_stack(task, silent)
+            restart = task.module.on_stuck(silent)
+            self.scheduler.abandon(task, restart=restart)
+            task.module.print(
+                "Module {}".format(
+                    "restarts once the stuck tick returns" if restart
+                    else "disabled"
+                )
+            )
+
+    def dump_stack(self, task, silent: float):
+        print(
+            "# ========\n"
+            "# Module {} stuck, no heartbeat for {:.1f}s\n"
+            "# ========"
+            .format(task.module.name, silent)
+        )
+        frame = sys._current_frames().get(task.thread_id)
+        if frame is None:
+            print("Thread is gone")
+        else:
+            traceback.print_stack(frame, file=sys.stdout)
+        print("# ========")
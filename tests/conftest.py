@@ -0,0 +1,17 @@
+import pytest
+
+from lazysiahosting.fakesiad import FakeSiad
+from lazysiahosting.siad import Siad
+
+
+@pytest.fixture
+def fake_siad():
+    server = FakeSiad(("127.0.0.1", 0))
+    server.start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def siad(fake_siad):
+    return Siad(fake_siad.host, "", retries=0)
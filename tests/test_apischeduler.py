@@ -0,0 +1,84 @@
+import threading
+import time
+
+from lazysiahosting.apischeduler import BULK, CRITICAL, NORMAL, ApiScheduler
+
+
+def run_calls(scheduler, calls):
+    """Start calls (priority, name) in order while a slot is taken."""
+    order = []
+    blocker = threading.Event()
+
+    def hold():
+        with scheduler.slot(NORMAL):
+            blocker.wait()
+
+    def call(priority, name):
+        with scheduler.slot(priority):
+            order.append(name)
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    time.sleep(0.05)
+    threads = []
+    for priority, name in calls:
+        thread = threading.Thread(target=call, args=(priority, name))
+        thread.start()
+        threads.append(thread)
+        time.sleep(0.02)
+    blocker.set()
+    for thread in [holder] + threads:
+        thread.join()
+    return order
+
+
+def test_waiters_are_admitted_by_priority():
+    scheduler = ApiScheduler(concurrency=1, rate=1000, burst=1000)
+    order = run_calls(scheduler, [
+        (BULK, "bulk"), (NORMAL, "normal"), (CRITICAL, "critical"),
+    ])
+    assert order == ["critical", "normal", "bulk"]
+
+
+def test_bulk_keeps_a_slot_free():
+    scheduler = ApiScheduler(concurrency=2, rate=1000, burst=1000)
+    entered = threading.Event()
+    release = threading.Event()
+
+    def bulk():
+        with scheduler.slot(BULK):
+            entered.set()
+            release.wait()
+
+    thread = threading.Thread(target=bulk)
+    thread.start()
+    entered.wait()
+    # One bulk call in flight, the second slot is left to others
+    assert not scheduler._has_slot(BULK)
+    assert scheduler._has_slot(NORMAL)
+    release.set()
+    thread.join()
+
+
+def test_token_bucket_limits_rate_but_not_critical():
+    scheduler = ApiScheduler(concurrency=4, rate=20, burst=1)
+    start = time.monotonic()
+    for _ in range(5):
+        with scheduler.slot(NORMAL):
+            pass
+    # 1 from the burst, 4 refilled at 20/s
+    assert time.monotonic() - start >= 0.15
+
+    start = time.monotonic()
+    for _ in range(5):
+        with scheduler.slot(CRITICAL):
+            pass
+    assert time.monotonic() - start < 0.05
+
+
+def test_slot_is_reentrant():
+    scheduler = ApiScheduler(concurrency=1)
+    with scheduler.slot(BULK):
+        with scheduler.slot(NORMAL):
+            pass
+    assert scheduler.stats["bulk"]["calls"] == 1
@@ -0,0 +1,64 @@
+import asyncio
+import threading
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+from aiohttp import ClientResponseError  # noqa: E402
+
+from lazysiahosting.asyncmodule import AsyncAutoModule, AsyncRunner  # noqa: E402
+from lazysiahosting.asyncsiad import AsyncSiad  # noqa: E402
+
+
+class Ranker(AsyncAutoModule):
+    interval = 100
+
+    def __init__(self, async_siad):
+        self.siad = async_siad
+        self.rank = None
+        self.ticked = threading.Event()
+
+    @property
+    def name(self) -> str:
+        return "Ranker"
+
+    def print_settings(self):
+        pass
+
+    async def tick(self):
+        self.rank, self.price = await self.siad.get_hostdb_rank_and_price()
+        self.ticked.set()
+
+
+def test_module_runs_against_fake_siad_and_session_closes(fake_siad):
+    async_siad = AsyncSiad(fake_siad.host, "")
+    runner = AsyncRunner()
+    runner.on_stop(async_siad.close)
+    runner.start()
+    module = Ranker(async_siad)
+    runner.add(module)
+
+    assert module.ticked.wait(5)
+    assert async_siad.hostdb.size == 501
+    assert 1 <= module.rank <= 501
+    assert round(module.price) == 100
+
+    runner.stop()
+    runner.thread.join(5)
+    assert not runner.thread.is_alive()
+    assert async_siad._session.closed
+
+
+def test_error_responses_raise(fake_siad):
+    fake_siad.failure_rate = 1
+
+    async def get_host():
+        async_siad = AsyncSiad(fake_siad.host, "")
+        try:
+            return await async_siad.get_host()
+        finally:
+            await async_siad.close()
+
+    with pytest.raises(ClientResponseError):
+        asyncio.run(get_host())
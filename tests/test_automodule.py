@@ -0,0 +1,70 @@
+import time
+
+import pytest
+
+from lazysiahosting import automodule
+from lazysiahosting.automodule import AutoModule
+from lazysiahosting.events import MODULE_FAILED, bus
+
+
+class Failing(AutoModule):
+    failure_budget = 3
+
+    def __init__(self):
+        pass
+
+    @property
+    def name(self) -> str:
+        return "Failing"
+
+    def fail(self) -> float:
+        try:
+            raise RuntimeError("broken")
+        except RuntimeError:
+            return self.record_failure()
+
+
+@pytest.fixture(autouse=True)
+def no_jitter(monkeypatch):
+    # The longest delay of each full jitter range
+    monkeypatch.setattr(
+        "lazysiahosting.circuitbreaker.uniform", lambda low, high: high
+    )
+
+
+def test_restart_delay_grows_and_resets_on_success():
+    module = Failing()
+    module.failure_budget = 100
+    delays = [module.fail() for _ in range(8)]
+    assert delays == [2, 4, 8, 16, 32, 64, 120, 120]
+    module.record_success()
+    assert module.fail() == 2
+
+
+def test_exceeded_budget_escalates():
+    module = Failing()
+    events = []
+    bus.subscribe(MODULE_FAILED, events.append)
+    try:
+        delays = [module.fail() for _ in range(4)]
+    finally:
+        bus.unsubscribe(MODULE_FAILED, events.append)
+    assert delays == [2, 4, 8, automodule.ESCALATION_COOLDOWN]
+    assert [event.data["failures"] for event in events] == [4]
+    # The budget and the backoff start over after an escalation
+    assert module.fail() == 2
+
+
+def test_failures_leave_the_window():
+    module = Failing()
+    module.failure_window = 0.05
+    for _ in range(3):
+        module.fail()
+    time.sleep(0.1)
+    assert module.fail() == 16
+
+
+def test_escalate_can_disable_the_module():
+    module = Failing()
+    module.escalate = lambda failures: None
+    assert [module.fail() for _ in range(4)][-1] is None
@@ -0,0 +1,49 @@
+from contextlib import nullcontext
+
+from lazysiahosting.autorestart import ERROR_HITS_MAX, AutoRestart
+from lazysiahosting.automodule import AutoModule
+from lazysiahosting.circuitbreaker import CircuitBreaker
+
+
+class Follower(AutoModule):
+    def __init__(self):
+        self.follow_siad_state()
+
+    @property
+    def name(self) -> str:
+        return "Follower"
+
+
+class UnreachableSiad:
+    """Siad which refuses connections until up is set."""
+
+    def __init__(self):
+        self.up = False
+        self.breaker = CircuitBreaker(failure_threshold=10 ** 6)
+
+    def priority(self, priority):
+        return nullcontext()
+
+    def get_host(self, fresh=False):
+        if not self.up:
+            raise ConnectionError("refused")
+        return {}
+
+
+def test_siad_up_after_a_restart():
+    siad = UnreachableSiad()
+    restart = AutoRestart({"sleep": 0, "cooldown": 0}, siad)
+    follower = Follower()
+    try:
+        for _ in range(ERROR_HITS_MAX):
+            restart.tick()
+        assert follower.siad_down
+        # Start commands, cooldown
+        restart.tick()
+
+        siad.up = True
+        restart.tick()
+        assert not follower.siad_down
+    finally:
+        restart.unsubscribe_all()
+        follower.unsubscribe_all()
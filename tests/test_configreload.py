@@ -0,0 +1,147 @@
+import threading
+import time
+
+import pytest
+
+import lazysiahosting
+from lazysiahosting import ConfigReloader, _get_enabled_modules
+from lazysiahosting.automodule import AutoModule
+from lazysiahosting.configwatch import ConfigWatcher
+from lazysiahosting.registry import ModuleSpec
+
+
+class Echo(AutoModule):
+    def __init__(self, configuration_dictionary: dict):
+        self.value = configuration_dictionary.get("value")
+        if self.value == "invalid":
+            raise ValueError("Invalid value")
+
+    @property
+    def name(self) -> str:
+        return "Echo"
+
+    def print_settings(self):
+        pass
+
+    def tick(self):
+        pass
+
+
+class Scheduler:
+    def __init__(self):
+        self.added = []
+        self.removed = []
+
+    def add(self, module):
+        self.added.append(module)
+
+    def remove(self, module, then=None):
+        self.removed.append(module)
+        if then:
+            then()
+
+
+CONFIG = """
+host: 127.0.0.1:9980
+first:
+    enabled: yes
+    value: 1
+second:
+    enabled: yes
+    value: 2
+"""
+
+
+@pytest.fixture
+def config_file(tmp_path, monkeypatch):
+    path = tmp_path / "config.yaml"
+    path.write_text(CONFIG)
+    monkeypatch.setattr(lazysiahosting, "CONFIG_YAML", str(path))
+    return path
+
+
+@pytest.fixture
+def reloader(config_file):
+    specs = (
+        ModuleSpec("first", __name__, "Echo"),
+        ModuleSpec("second", __name__, "Echo"),
+    )
+    services = {"scheduler": Scheduler()}
+    config = lazysiahosting._load_config()
+    modules = _get_enabled_modules(config, specs, services)
+    return ConfigReloader(config, specs, services, modules, async_runner=None)
+
+
+def test_only_changed_sections_are_rebuilt(config_file, reloader):
+    first, second = reloader.modules["first"], reloader.modules["second"]
+    config_file.write_text(CONFIG.replace("value: 2", "value: 3"))
+    reloader.reload()
+    assert reloader.modules["first"] is first
+    assert reloader.modules["second"] is not second
+    assert reloader.modules["second"].value == 3
+    assert reloader.scheduler.removed == [second]
+    assert reloader.scheduler.added == [reloader.modules["second"]]
+
+
+@pytest.mark.parametrize("second", [
+    "second: {enabled: yes, value: invalid}",
+    "second: yes",
+    "second: [enabled]",
+])
+def test_invalid_section_rejects_the_whole_reload(
+    config_file, reloader, second
+):
+    modules = dict(reloader.modules)
+    config_file.write_text(
+        "host: 127.0.0.1:9980\n"
+        "first: {enabled: yes, value: 5}\n"
+        + second + "\n"
+    )
+    reloader.reload()
+    assert reloader.modules == modules
+    assert reloader.modules["first"].value == 1
+    assert reloader.scheduler.removed == []
+
+
+@pytest.mark.parametrize("content", ["just a string", "- a list", "first: ["])
+def test_malformed_config_keeps_running_configuration(
+    config_file, reloader, content
+):
+    modules = dict(reloader.modules)
+    config_file.write_text(content)
+    reloader.reload()
+    assert reloader.modules == modules
+    assert reloader.scheduler.removed == []
+
+
+def test_siad_keys_are_ignored(config_file, reloader):
+    config_file.write_text(
+        CONFIG.replace("127.0.0.1:9980", "10.0.0.1:9980")
+        .replace("value: 1", "value: 4")
+    )
+    reloader.reload()
+    assert reloader.config["host"] == "127.0.0.1:9980"
+    assert reloader.modules["first"].value == 4
+
+
+def test_watcher_survives_a_failing_callback(tmp_path):
+    path = tmp_path / "config.yaml"
+    path.write_text("first: 1\n")
+    calls = []
+    called = threading.Semaphore(0)
+
+    def callback():
+        calls.append(path.read_text())
+        called.release()
+        if len(calls) == 1:
+            raise AttributeError("'bool' object has no attribute 'get'")
+
+    ConfigWatcher(str(path), callback, poll_interval=0.05).start()
+    # Let the watcher settle before the first change
+    time.sleep(0.3)
+    path.write_text("first: 2\n")
+    assert called.acquire(timeout=5)
+    time.sleep(0.3)
+    path.write_text("first: 3\n")
+    assert called.acquire(timeout=5)
+    assert calls[-1] == "first: 3\n"
@@ -0,0 +1,88 @@
+import threading
+import time
+
+from lazysiahosting.exchangerate import CachedRate, FileRateProvider
+
+
+class CountingProvider(FileRateProvider):
+    def __init__(self, path, delay=0):
+        super().__init__(str(path))
+        self.delay = delay
+        self.fetches = 0
+
+    def fetch(self) -> float:
+        self.fetches += 1
+        time.sleep(self.delay)
+        return super().fetch()
+
+
+def test_fresh_rate_is_served_from_memory(tmp_path):
+    rate_file = tmp_path / "rate"
+    rate_file.write_text("0.004")
+    provider = CountingProvider(rate_file)
+    rate = CachedRate(provider, cache_path=str(tmp_path / "cache.json"))
+    assert rate.get() == 0.004
+    rate_file.write_text("0.005")
+    assert rate.get() == 0.004
+    assert provider.fetches == 1
+
+
+def test_stale_rate_is_returned_while_refreshing(tmp_path):
+    rate_file = tmp_path / "rate"
+    rate_file.write_text("0.004")
+    provider = CountingProvider(rate_file)
+    rate = CachedRate(
+        provider, ttl=0.1, cache_path=str(tmp_path / "cache.json")
+    )
+    assert rate.get() == 0.004
+    rate_file.write_text("0.005")
+    provider.delay = 0.2
+    time.sleep(0.1)
+    assert rate.get() == 0.004
+    deadline = time.monotonic() + 5
+    while rate.rate != 0.005 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert rate.rate == 0.005
+    assert provider.fetches == 2
+
+
+def test_disk_cache_survives_a_new_instance(tmp_path):
+    rate_file = tmp_path / "rate"
+    rate_file.write_text("0.004")
+    cache_path = str(tmp_path / "cache.json")
+    provider = FileRateProvider(str(rate_file))
+    assert CachedRate(provider, cache_path=cache_path).get() == 0.004
+
+    rate_file.unlink()
+    restarted = CachedRate(provider, cache_path=cache_path)
+    assert restarted.age < 5
+    assert restarted.get() == 0.004
+
+
+def test_concurrent_refreshes_are_coalesced(tmp_path):
+    rate_file = tmp_path / "rate"
+    rate_file.write_text("0.004")
+    provider = CountingProvider(rate_file, delay=0.2)
+    rate = CachedRate(provider, cache_path=None)
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(rate.refresh()))
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [0.004] * 5
+    assert provider.fetches == 1
+
+
+def test_failed_cold_fetch_returns_none(tmp_path):
+    rate = CachedRate(
+        FileRateProvider(str(tmp_path / "missing")),
+        cache_path=str(tmp_path / "cache.json"),
+    )
+    assert rate.get() is None
+    (tmp_path / "missing").write_text("not a number")
+    assert rate.get() is None
+    assert not (tmp_path / "cache.json").exists()
@@ -0,0 +1,61 @@
+import json
+
+import pytest
+
+from lazysiahosting.hostdb import (
+    ArrayItemParser, HostDBIndex, iter_array_items, iter_hosts
+)
+
+DOCUMENT = json.dumps({
+    "height": 1,
+    "hosts": [
+        {"netaddress": "a:9982", "publickey": {"algorithm": "ed25519", "key": "aa"},
+         "storageprice": "300", "note": "comma, \"quoted\" ]"},
+        {"netaddress": "b:9982", "publickey": {"algorithm": "ed25519", "key": "bb"},
+         "storageprice": "200", "note": "ünïcode"},
+        {"netaddress": "c:9982", "publickey": None, "storageprice": "100"},
+    ],
+}).encode()
+
+
+def chunked(data: bytes, size: int):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def test_items_survive_every_chunk_size():
+    expected = json.loads(DOCUMENT)["hosts"]
+    for size in range(1, len(DOCUMENT) + 1):
+        assert list(iter_array_items(chunked(DOCUMENT, size))) == expected, size
+
+
+def test_missing_and_empty_arrays():
+    assert list(iter_array_items([b'{"hosts": null}'])) == []
+    assert list(iter_array_items([b'{"hosts": [ ]}'])) == []
+
+
+def test_truncated_array_raises():
+    with pytest.raises(json.JSONDecodeError):
+        list(iter_array_items([DOCUMENT[:60]]))
+
+
+def test_parser_returns_the_items_each_chunk_completed():
+    parser = ArrayItemParser()
+    items = [parser.feed(chunk) for chunk in chunked(DOCUMENT, 100)]
+    assert [len(completed) for completed in items] == [0, 1, 1, 1]
+    assert parser.done
+    parser.close()
+
+
+def test_iter_hosts_reduces_fields():
+    hosts = list(iter_hosts(chunked(DOCUMENT, 7), ("netaddress",)))
+    assert hosts == [{"netaddress": "a:9982"}, {"netaddress": "b:9982"},
+                     {"netaddress": "c:9982"}]
+
+
+def test_index_ranks_best_last_and_looks_up():
+    index = HostDBIndex()
+    index.refresh(iter_hosts([DOCUMENT], HostDBIndex.FIELDS), timestamp=1)
+    assert index.size == 3
+    assert index.lookup(pubkey="ed25519:aa").rank == 3
+    assert index.lookup(pubkey="ed25519:zz", netaddress="c:9982").rank == 1
+    assert index.lookup(netaddress="unknown") is None
@@ -0,0 +1,36 @@
+from lazysiahosting.metrics import LATENCY_BUCKETS, RequestMetrics
+
+
+def test_percentiles_are_bucket_upper_bounds():
+    metrics = RequestMetrics()
+    for _ in range(90):
+        metrics.record('GET', '/host', 0.001)
+    for _ in range(9):
+        metrics.record('GET', '/host', 0.1)
+    metrics.record('GET', '/host', 1000)
+    stats = metrics.snapshot()[('GET', '/host')]
+    assert stats['calls'] == 100
+    assert stats['p50'] == LATENCY_BUCKETS[0]
+    assert 0.1 <= stats['p95'] < 0.15
+    assert stats['p99'] == stats['p95']
+    assert abs(stats['mean'] - 10.0099) < 1e-9
+
+
+def test_slower_than_every_bucket_is_infinite():
+    metrics = RequestMetrics()
+    metrics.record('GET', '/hostdb/active', 1000)
+    assert metrics.snapshot()[('GET', '/hostdb/active')]['p50'] == float('inf')
+
+
+def test_summary_lists_the_slowest_endpoint_first():
+    metrics = RequestMetrics()
+    metrics.record('GET', '/host', 0.002, bytes_received=1000)
+    metrics.record('POST', '/host?minstorageprice=1', 0.002, error=True)
+    metrics.record('GET', '/hostdb/active', 2.5, bytes_received=500)
+    metrics.add_bytes('GET', '/hostdb/active', 1500)
+    assert metrics.summary() == [
+        "GET /hostdb/active: 1 calls, 0 errors, 2.0kB, "
+        "p50 3.3s p95 3.3s p99 3.3s",
+        "GET /host: 1 calls, 0 errors, 1.0kB, p50 2ms p95 2ms p99 2ms",
+        "POST /host: 1 calls, 1 errors, 0.0kB, p50 2ms p95 2ms p99 2ms",
+    ]
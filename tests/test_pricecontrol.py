@@ -0,0 +1,75 @@
+import random
+
+from lazysiahosting.autoprice import AutoPrice
+from lazysiahosting.pricecontrol import (
+    ConvergenceTracker,
+    RankModel,
+    StepController,
+    get_controller,
+)
+
+
+def market(seed: int) -> list:
+    """Competitor prices like the fake siad, 500 hosts of 10-1000SC."""
+    generator = random.Random(seed)
+    return sorted(generator.uniform(10, 1000) for _ in range(500))
+
+
+def cycles_to_target(controller, prices, target, price, limit=100):
+    tracker = ConvergenceTracker(controller.deadband)
+    for _ in range(limit):
+        rank = 1 + sum(other < price for other in prices)
+        delta = target - rank
+        if abs(delta) <= controller.deadband:
+            return tracker._cycles
+        tracker.update(delta)
+        price = max(10, controller.next_price(price, delta))
+    return limit
+
+
+def test_pid_reaches_targets_in_a_few_cycles():
+    cycles = []
+    for seed in range(4):
+        prices = market(seed)
+        for target in (5, 45, 150, 300, 450):
+            for start in (20, 100, 400, 900):
+                cycles.append(cycles_to_target(
+                    get_controller({}), prices, target, start
+                ))
+    assert max(cycles) < 25
+    assert sum(cycles) / len(cycles) < 8
+
+
+def test_step_controller_is_the_old_fixed_step():
+    controller = StepController(factor=1.01, deadband=0, max_step=10)
+    assert round(controller.next_price(100, 3), 4) == round(100 * 1.01 ** 3, 4)
+    assert controller.next_price(100, 0) == 100
+
+
+def test_rank_model_solves_the_target_rank():
+    prices = market(0)
+    model = RankModel(prices, price=100, rank=1 + sum(p < 100 for p in prices))
+    for target in (1, 45, 300, 500):
+        assert model.rank(model.solve(target, low=1, high=2000)) == target
+
+
+def test_convergence_tracker_reports_overshoot():
+    tracker = ConvergenceTracker(deadband=1)
+    tracker.update(10)
+    tracker.update(-5)
+    assert tracker.update(0).startswith("Reached target after 2 cycles")
+    assert tracker.overshoot == 5
+    assert tracker.converged
+
+
+def test_solver_hits_the_rank_in_one_cycle(fake_siad, siad):
+    for target in (45, 300, 3):
+        module = AutoPrice({
+            "minimum-price": 5,
+            "collateral-factor": 2,
+            "hostdb-rank": target,
+            "solver": True,
+        }, siad)
+        module.tick()
+        rank, _ = siad.get_hostdb_rank_and_price()
+        assert rank == target
@@ -0,0 +1,69 @@
+import pytest
+
+from lazysiahosting import registry
+from lazysiahosting.registry import (
+    BUILTIN_MODULES,
+    LazyService,
+    ModuleSpec,
+    discover_modules,
+    import_report,
+    resolve_requirements,
+)
+
+
+class Plugin:
+    config_section = "plugin"
+    requires = ("siad", "async_siad")
+
+
+class EntryPoint:
+    def __init__(self, name, module, attr):
+        self.name = name
+        self.module = module
+        self.attr = attr
+
+
+@pytest.fixture
+def entry_points(monkeypatch):
+    found = []
+    monkeypatch.setattr(registry, "_registered", [])
+    monkeypatch.setattr(registry, "_entry_points", lambda group: found)
+    return found
+
+
+def test_first_module_of_a_section_wins(entry_points, capsys):
+    registry.register_module(ModuleSpec("plugin", __name__, "Plugin"))
+    entry_points.append(EntryPoint("plugin", "other.package", "Plugin"))
+    entry_points.append(EntryPoint("price", "other.package", "Price"))
+    specs = discover_modules()
+    assert specs[:len(BUILTIN_MODULES)] == BUILTIN_MODULES
+    assert [(spec.section, spec.module_path) for spec in specs[-1:]] == [
+        ("plugin", __name__)
+    ]
+    assert capsys.readouterr().out.count("already taken") == 2
+
+
+def test_load_checks_the_declared_section():
+    spec = ModuleSpec("plugin", __name__, "Plugin")
+    assert spec.load() is Plugin
+    assert import_report([spec])[0].startswith("Plugin: ")
+    with pytest.raises(ValueError):
+        ModuleSpec("other", __name__, "Plugin").load()
+
+
+def test_requirements_are_resolved_in_order():
+    built = []
+
+    def build():
+        built.append(True)
+        return "async siad"
+
+    services = {"siad": "siad", "async_siad": LazyService(build)}
+    assert resolve_requirements(Plugin, services) == ["siad", "async siad"]
+    assert resolve_requirements(Plugin, services) == ["siad", "async siad"]
+    assert built == [True]
+
+
+def test_missing_service_is_a_config_error():
+    with pytest.raises(ValueError, match="requires 'async_siad'"):
+        resolve_requirements(Plugin, {"siad": "siad"})
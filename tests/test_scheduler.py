@@ -0,0 +1,113 @@
+import threading
+import time
+
+from lazysiahosting.automodule import AutoModule
+from lazysiahosting.scheduler import Scheduler
+from lazysiahosting.watchdog import Watchdog
+
+
+class Module(AutoModule):
+    interval = 100
+    deadline = 0.1
+
+    def __init__(self, name="Module", duration=0):
+        self._name = name
+        self.duration = duration
+        self.ticks = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    def print_settings(self):
+        pass
+
+    def tick(self):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        self.ticks += 1
+        duration = self.duration if self.ticks == 1 else 0
+        time.sleep(duration)
+        self.in_flight -= 1
+
+
+def run(scheduler):
+    thread = threading.Thread(target=scheduler.run, daemon=True)
+    thread.start()
+    return thread
+
+
+def test_modules_tick_on_their_own_intervals():
+    scheduler = Scheduler(workers=1)
+    fast = Module("Fast")
+    fast.interval = 0.05
+    slow = Module("Slow")
+    scheduler.add(fast)
+    scheduler.add(slow)
+    thread = run(scheduler)
+    time.sleep(0.3)
+    scheduler.stop()
+    thread.join()
+    assert fast.ticks >= 3
+    assert slow.ticks == 1
+
+
+def test_stop_returns_within_grace():
+    scheduler = Scheduler(workers=1, grace=0.2)
+    scheduler.add(Module(duration=5))
+    thread = run(scheduler)
+    time.sleep(0.1)
+    start = time.monotonic()
+    scheduler.stop()
+    thread.join()
+    assert time.monotonic() - start < 0.5
+
+
+def test_watchdog_ignores_queued_ticks():
+    scheduler = Scheduler(workers=1)
+    slow = Module("Slow", duration=0.3)
+    queued = Module("Queued")
+    scheduler.add(slow)
+    scheduler.add(queued)
+    watchdog = Watchdog(scheduler, factor=100)
+    thread = run(scheduler)
+    time.sleep(0.1)
+    # Queued waits for the only worker, it has no heartbeat yet
+    watchdog.check()
+    assert [task.module for task in scheduler.running_tasks()] == [slow]
+    scheduler.stop()
+    thread.join()
+
+
+def test_abandoned_tick_is_restarted_after_it_returned():
+    scheduler = Scheduler(workers=1)
+    module = Module(duration=0.5)
+    module.interval = 0.05
+    scheduler.add(module)
+    watchdog = Watchdog(scheduler, factor=2)
+    thread = run(scheduler)
+    time.sleep(0.3)
+    watchdog.check()
+    assert watchdog.stuck_ticks == 1
+    time.sleep(0.5)
+    scheduler.stop()
+    thread.join()
+    assert module.ticks >= 2
+    assert module.max_in_flight == 1
+
+
+def test_remove_calls_back_after_the_tick_in_flight():
+    scheduler = Scheduler(workers=1)
+    module = Module(duration=0.3)
+    scheduler.add(module)
+    thread = run(scheduler)
+    time.sleep(0.1)
+    removed = threading.Event()
+    scheduler.remove(module, removed.set)
+    assert not removed.is_set()
+    assert removed.wait(1)
+    assert module.in_flight == 0
+    scheduler.stop()
+    thread.join()
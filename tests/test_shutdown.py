@@ -0,0 +1,42 @@
+import signal
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def test_sigterm_stops_quickly(fake_siad, tmp_path):
+    (tmp_path / "config.yaml").write_text(
+        "host: {}\n"
+        "api-password: x\n"
+        "unlock:\n"
+        "    enabled: yes\n"
+        "    wallet-password: password\n"
+        "price:\n"
+        "    enabled: yes\n"
+        "    minimum-price: 5\n"
+        "    collateral-factor: 2\n"
+        "    hostdb-rank: 45\n".format(fake_siad.host)
+    )
+    process = subprocess.Popen(
+        [sys.executable, "-m", "lazysiahosting"],
+        cwd=tmp_path,
+        env={"PYTHONPATH": str(ROOT), "PYTHONUNBUFFERED": "1"},
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+    )
+    try:
+        for line in process.stdout:
+            if "Start module" in line:
+                break
+        time.sleep(0.5)
+        start = time.monotonic()
+        process.send_signal(signal.SIGTERM)
+        process.wait(10)
+        assert time.monotonic() - start < 1.5
+        assert process.returncode == 0
+    finally:
+        process.kill()
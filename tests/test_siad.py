@@ -0,0 +1,85 @@
+import threading
+
+import pytest
+from requests.exceptions import HTTPError, ReadTimeout
+
+from lazysiahosting.circuitbreaker import CLOSED, CircuitBreaker
+from lazysiahosting.fakesiad import NETADDRESS, WALLET_PASSWORD
+from lazysiahosting.siad import Result, Siad
+
+
+def test_error_responses_are_not_cached(fake_siad, siad):
+    fake_siad.failure_rate = 1
+    with pytest.raises(HTTPError):
+        siad.get_host()
+    fake_siad.failure_rate = 0
+    assert siad.public_hostname == NETADDRESS
+    siad.storage_price = 90
+    assert round(siad.storage_price) == 90
+
+
+def test_unlock_outlasts_the_read_timeout(fake_siad):
+    fake_siad.state.unlock_delay = 1
+    siad = Siad(fake_siad.host, "", read_timeout=0.2, retries=0)
+    assert siad.unlock_wallet(WALLET_PASSWORD) == Result.SUCCESS
+    assert siad.wallet_unlocked
+
+
+def test_unlock_timeout_is_no_breaker_failure(fake_siad):
+    fake_siad.state.unlock_delay = 1
+    siad = Siad(
+        fake_siad.host, "", unlock_timeout=0.2, retries=0,
+        breaker=CircuitBreaker(failure_threshold=1),
+    )
+    with pytest.raises(ReadTimeout):
+        siad.unlock_wallet(WALLET_PASSWORD)
+    assert siad.breaker.state == CLOSED
+
+
+def test_batch_writes_once(fake_siad, siad):
+    with siad.batch_host():
+        siad.storage_price = 80
+        siad.collateral = 160
+    assert fake_siad.state.host_writes == 1
+    assert round(siad.collateral) == 160
+
+
+def test_failed_batch_is_dropped(fake_siad, siad):
+    with pytest.raises(RuntimeError):
+        with siad.batch_host():
+            siad.storage_price = 50
+            raise RuntimeError()
+    with siad.batch_host():
+        siad.collateral = 300
+    assert round(siad.storage_price) == 100
+    assert round(siad.collateral) == 300
+    assert fake_siad.state.host_writes == 1
+
+
+def test_batches_of_threads_are_separate(fake_siad, siad):
+    staged = threading.Event()
+    release = threading.Event()
+
+    def other_thread():
+        with siad.batch_host():
+            siad.storage_price = 70
+            staged.set()
+            release.wait()
+
+    thread = threading.Thread(target=other_thread)
+    thread.start()
+    staged.wait()
+    with siad.batch_host():
+        siad.collateral = 150
+    # Our flush must not write the price staged by the other thread
+    assert round(siad.storage_price) == 100
+    release.set()
+    thread.join()
+    assert round(siad.storage_price) == 70
+
+
+def test_hostdb_rank(siad):
+    rank, price = siad.get_hostdb_rank_and_price()
+    assert siad.hostdb.size == 501
+    assert round(price) == 100
+    assert 1 <= rank <= 501
@@ -0,0 +1,95 @@
+import json
+
+import pytest
+from requests import Response
+from requests.exceptions import HTTPError
+
+from lazysiahosting.siastats import Siastats
+
+
+class Siad:
+    public_hostname = "my.host"
+    pubkey = "ed25519:mine"
+    storage_price = 100
+
+
+def response(document, status_code=200) -> Response:
+    res = Response()
+    res.status_code = status_code
+    res._content = json.dumps(document).encode()
+    return res
+
+
+class StubSiastats(Siastats):
+    """Siastats answering from all_hosts and hosts, by id."""
+
+    def __init__(self, all_hosts, hosts, **kwargs):
+        self.all_hosts = all_hosts
+        self.hosts = hosts
+        self.requests = []
+        super().__init__(Siad(), **kwargs)
+
+    def request(self, method: str, uri, headers: dict = None, **kwargs):
+        self.requests.append(uri)
+        if uri == '/hosts-api/allhosts':
+            return response(self.all_hosts)
+        host_id = int(uri.rsplit('/', 1)[1])
+        if host_id not in self.hosts:
+            res = response({}, 404)
+            raise HTTPError(response=res)
+        return response(self.hosts[host_id])
+
+
+OTHER = {'Id': 1, 'CurrentIp': 'other.host', 'Pubkey': 'ed25519:other'}
+MINE = {'Id': 2, 'CurrentIp': 'old.ip', 'Pubkey': 'ed25519:mine'}
+HOST = {'rank': 7, 'online': True, 'storagePrice': 100}
+
+
+def test_host_id_is_cached_on_disk(tmp_path):
+    cache_path = str(tmp_path / "siastats-host.json")
+    siastats = StubSiastats([OTHER, MINE], {2: HOST}, cache_path=cache_path)
+    assert siastats.rank == 7
+    assert siastats.requests == ['/hosts-api/allhosts', '/hosts-api/host/2']
+
+    restarted = StubSiastats([], {2: HOST}, cache_path=cache_path)
+    assert restarted.rank == 7
+    assert restarted.requests == ['/hosts-api/host/2']
+
+
+def test_all_hosts_are_indexed_for_hosts_ttl():
+    siastats = StubSiastats([OTHER, MINE], {}, cache_path=None)
+    assert siastats.lookup(pubkey='ed25519:other') == OTHER
+    assert siastats.lookup(host_name='old.ip') == MINE
+    assert siastats.requests == ['/hosts-api/allhosts']
+
+    siastats.hosts_ttl = 0
+    siastats.lookup(pubkey='ed25519:other')
+    assert siastats.requests == ['/hosts-api/allhosts'] * 2
+
+
+def test_miss_in_an_old_list_forces_a_refresh():
+    siastats = StubSiastats([OTHER], {2: HOST}, cache_path=None)
+    siastats.refresh_hosts()
+    siastats.all_hosts = [OTHER, MINE]
+    assert siastats.host_id == 2
+    assert siastats.requests == ['/hosts-api/allhosts'] * 2
+
+
+def test_miss_in_a_fresh_list_is_not_refetched():
+    siastats = StubSiastats([OTHER], {}, cache_path=None)
+    assert siastats.host_id is None
+    assert siastats.requests == ['/hosts-api/allhosts']
+
+
+def test_host_id_is_dropped_on_404(tmp_path):
+    cache_path = tmp_path / "siastats-host.json"
+    cache_path.write_text(json.dumps({"my.host": 3}))
+    siastats = StubSiastats(
+        [OTHER, MINE], {2: HOST}, cache_path=str(cache_path)
+    )
+    with pytest.raises(HTTPError):
+        siastats.host
+    assert json.loads(cache_path.read_text()) == {}
+
+    assert siastats.rank == 7
+    assert json.loads(cache_path.read_text()) == {"my.host": 2}
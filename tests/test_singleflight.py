@@ -0,0 +1,46 @@
+import threading
+import time
+
+import pytest
+
+from lazysiahosting.singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_call():
+    flight = SingleFlight()
+    calls = []
+    started = threading.Event()
+
+    def slow():
+        calls.append(1)
+        started.set()
+        time.sleep(0.2)
+        return "result"
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do("k", slow)))
+    leader.start()
+    started.wait()
+    followers = [
+        threading.Thread(target=lambda: results.append(flight.do("k", slow)))
+        for _ in range(5)
+    ]
+    for thread in followers:
+        thread.start()
+    for thread in [leader] + followers:
+        thread.join()
+
+    assert results == ["result"] * 6
+    assert len(calls) == 1
+    assert flight.stats == {"calls": 1, "coalesced": 5}
+
+
+def test_errors_are_shared_and_not_kept():
+    flight = SingleFlight()
+
+    def fail():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        flight.do("k", fail)
+    assert flight.do("k", lambda: 1) == 1